@@ -0,0 +1,499 @@
+"""
+Micro-benchmarks for the Brewin interpreter and its execution backends.
+
+Usage: python benchmark.py [benchmark name ...]   (runs everything by default)
+"""
+
+import glob
+import os
+import sys
+import time
+import tracemalloc
+
+from brewparse import parse_program
+from interpreterv1 import Interpreter
+import transpiler
+from environment import Environment, ShallowEnvironment
+from objects import OBJECT_TYPES, InternTable
+
+
+def run_program(ast, inp=None, **options):
+    """Execute an already-parsed program on a fresh Interpreter; returns the interpreter."""
+    interpreter = Interpreter(False, inp, False, **options)
+    interpreter.eval_program(ast)
+    return interpreter
+
+
+def call_main(interpreter, times):
+    """Re-run main() on an interpreter that has already loaded the program."""
+    main_func = interpreter.env.retrieve("main")
+    for _ in range(times):
+        interpreter.call_function(main_func, [])
+
+
+def best_time(func, repeat=5):
+    """Best wall-clock time of `repeat` calls to func, in seconds."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def compare_backends(ast, backends, calls=1, repeat=5, **options):
+    """Print the best time to load the program and run main() `calls` times per backend."""
+    baseline = None
+    for backend in backends:
+        def run():
+            call_main(run_program(ast, backend=backend, **options), calls - 1)
+
+        elapsed = best_time(run, repeat)
+        baseline = baseline or elapsed
+        print(f"  {backend:<10} {elapsed * 1000:9.2f} ms  ({baseline / elapsed:5.2f}x)")
+
+
+def nested_arith_program(statements):
+    """test_nested.br's expression, repeated `statements` times in main."""
+    body = "\n".join(
+        "  a = ((5 + (6 - 3)) - ((2 - 3) - (1 - 7)));" for _ in range(statements)
+    )
+    return f"def main() {{\n  var a;\n{body}\n  print(a);\n}}"
+
+
+def bench_arith_backends():
+    """Arithmetic-heavy main, called 50 times, under each backend."""
+    ast = parse_program(nested_arith_program(200))
+    compare_backends(ast, ["tree", "closure", "bytecode"], calls=50)
+
+
+def bench_temporaries():
+    """Cost of anonymous values: test_nested.br-style expressions, 13,000 temporaries per run."""
+    ast = parse_program(nested_arith_program(1000))
+    elapsed = best_time(lambda: run_program(ast))
+    print(f"  tree       {elapsed * 1000:9.2f} ms  ({elapsed / 13000 * 1e6:.2f} us per temporary)")
+
+
+def bench_value_memory():
+    """Bytes per live Int/String value and time to allocate them through create_object."""
+    count = 100_000
+    default_table = Environment.interned
+    for obj_type, values in [(OBJECT_TYPES.INT, range(1000, 1000 + count)),
+                             (OBJECT_TYPES.STRING, [f"s{i}" for i in range(count)])]:
+        def allocate():
+            return [Environment.create_object(name="", node=None, env=None, value=value, obj_type=obj_type)
+                    for value in values]
+
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        live = allocate()
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        # exclude the list holding the values
+        per_value = (after - before - sys.getsizeof(live)) / count
+        elapsed = best_time(allocate)
+        print(f"  {obj_type.name:<8} {per_value:6.1f} bytes/value   {elapsed / count * 1e9:6.1f} ns/allocation")
+        # start later benchmarks with an empty string table
+        Environment.interned = InternTable(default_table.low, default_table.high)
+
+
+def bench_interning():
+    """Small-int interning on test_nested.br-style expressions (all values in -5..256)."""
+    ast = parse_program(nested_arith_program(1000))
+    default_table = Environment.interned
+    try:
+        for label, table in [("no small ints", InternTable(0, -1)), ("-5..256", default_table)]:
+            Environment.interned = table
+            elapsed = best_time(lambda: run_program(ast), repeat=30)
+            print(f"  {label:<14} {elapsed * 1000:9.2f} ms")
+    finally:
+        Environment.interned = default_table
+
+
+def bench_unboxed_arith():
+    """Per-expression cost of test_nested.br's expression vs the same Python expression."""
+    statements, calls = 200, 50
+    ast = parse_program(nested_arith_program(statements))
+    for backend in ["tree", "closure", "bytecode"]:
+        elapsed = best_time(lambda: call_main(run_program(ast, backend=backend), calls - 1))
+        print(f"  {backend:<10} {elapsed / (statements * calls) * 1e9:8.0f} ns/expression")
+
+    def python_expr(a, b, c, d, e, f, g):
+        return ((a + (b - c)) - ((d - e) - (f - g)))
+
+    def python_loop():
+        for _ in range(statements * calls):
+            python_expr(5, 6, 3, 2, 3, 1, 7)
+
+    elapsed = best_time(python_loop)
+    print(f"  {'python':<10} {elapsed / (statements * calls) * 1e9:8.0f} ns/expression")
+
+
+def call_program(call, statements):
+    """A tiny two-argument function and a main that makes `statements` calls."""
+    body = "\n".join(f"  {call};" for _ in range(statements))
+    return f"def tiny(a, b) {{\n  var c;\n  c = a;\n}}\n\ndef main() {{\n  var x;\n  x = 1;\n{body}\n}}"
+
+
+def bench_call_protocol():
+    """Per-call cost of builtin and user-defined calls, 100,000 calls per backend."""
+    statements, calls = 1000, 100
+    for call in ["print(x, 2)", "tiny(x, 2)"]:
+        print(f"  {call}")
+        ast = parse_program(call_program(call, statements))
+        for backend in ["tree", "closure", "bytecode"]:
+            elapsed = best_time(lambda: call_main(run_program(ast, backend=backend), calls - 1), repeat=3)
+            print(f"    {backend:<10} {elapsed / (statements * calls) * 1e9:8.0f} ns/call")
+
+
+def deep_call_program(depth, calls):
+    """main -> f1 -> ... -> f<depth>, and the deepest function calls tiny() `calls` times."""
+    body = "\n".join("  tiny();" for _ in range(calls))
+    funcs = [f"def f{depth}() {{\n{body}\n}}"]
+    funcs += [f"def f{i}() {{\n  f{i + 1}();\n}}" for i in range(depth - 1, 0, -1)]
+    return "def tiny() {\n  var t;\n}\n\n" + "\n\n".join(funcs) + "\n\ndef main() {\n  f1();\n}"
+
+
+def bench_call_depth():
+    """Cost of a call to tiny() made at increasing Brewin call depths (dynamic scoping)."""
+    calls = 2000
+    for depth in [1, 50, 200]:
+        ast = parse_program(deep_call_program(depth, calls))
+        timings = []
+        for backend in ["tree", "closure", "bytecode"]:
+            elapsed = best_time(lambda: run_program(ast, backend=backend), repeat=3)
+            timings.append(f"{backend} {elapsed / calls * 1e9:7.0f}")
+        print(f"  depth {depth:<5} ns/call: " + "   ".join(timings))
+
+
+def bench_binding():
+    """Lookup and assignment of a global from call depths 10, 1,000 and 100,000, deep vs shallow binding."""
+    for depth in [10, 1000, 100_000]:
+        # the deep scan is O(depth), so fewer accesses at larger depths
+        accesses = max(10, 100_000 // depth)
+        timings = []
+        for label, env in [("deep", Environment()), ("shallow", ShallowEnvironment())]:
+            env.define_identifier("g", 1)
+            for _ in range(depth):
+                env.push_frame()
+                env.define_identifier("t", 0)
+
+            def access():
+                for _ in range(accesses):
+                    env.assign_identifier("g", env.retrieve("g"))
+
+            elapsed = best_time(access, repeat=1 if depth > 1000 else 5)
+            timings.append(f"{label} {elapsed / accesses * 1e9:10.0f}")
+        print(f"  depth {depth:<7} ns/access: " + "   ".join(timings))
+
+
+def global_read_program(depth, reads):
+    """main -> f1 -> ... -> f<depth>, and the deepest function reads the global tiny `reads` times."""
+    body = "  var t;\n" + "\n".join("  t = tiny;" for _ in range(reads))
+    funcs = [f"def f{depth}() {{\n{body}\n}}"]
+    funcs += [f"def f{i}() {{\n  f{i + 1}();\n}}" for i in range(depth - 1, 0, -1)]
+    return "def tiny() {\n  var t;\n}\n\n" + "\n\n".join(funcs) + "\n\ndef main() {\n  f1();\n}"
+
+
+def bench_scoping():
+    """Reading a global function from increasing call depths, dynamic vs static scoping."""
+    reads, calls = 1000, 20
+    for depth in [1, 50, 200]:
+        ast = parse_program(global_read_program(depth, reads))
+        print(f"  depth {depth}")
+        for backend in ["tree", "closure", "bytecode"]:
+            timings = []
+            for scoping in ["dynamic", "static"]:
+                interpreter = run_program(ast, backend=backend, scoping=scoping)
+                elapsed = best_time(lambda: call_main(interpreter, calls), repeat=3)
+                timings.append(f"{scoping} {elapsed / (reads * calls) * 1e9:7.0f}")
+            print(f"    {backend:<10} ns/read: " + "   ".join(timings))
+
+
+def bench_frame_pool():
+    """Call-heavy main (100,000 calls to tiny) with and without frame reuse."""
+    statements, calls = 1000, 100
+    ast = parse_program(call_program("tiny(x, 2)", statements))
+    for backend in ["tree", "closure", "bytecode"]:
+        for frame_pool in [0, 64]:
+            interpreter = run_program(ast, backend=backend, frame_pool=frame_pool)
+            elapsed = best_time(lambda: call_main(interpreter, calls), repeat=3)
+            stats = interpreter.env.pool_stats()
+            print(f"  {backend:<10} pool {frame_pool:<3} {elapsed / (statements * calls) * 1e9:6.0f} ns/call"
+                  f"   {stats['frames_allocated']:>7} frames allocated, {stats['frames_reused']:>7} reused")
+
+
+def nested_expr_program(depth):
+    """main assigns an expression nested `depth` parentheses deep."""
+    expr = "1"
+    for _ in range(depth):
+        expr = f"({expr} + 1)"
+    return f"def main() {{\n  var a;\n  a = {expr};\n  print(a);\n}}"
+
+
+def call_chain_program(depth):
+    """main -> f0 -> ... -> f<depth>, each call passing its argument plus one."""
+    funcs = [f"def f{i}(x) {{\n  f{i + 1}(x + 1);\n}}" for i in range(depth)]
+    funcs.append(f"def f{depth}(x) {{\n  print(x);\n}}")
+    return "\n\n".join(funcs) + "\n\ndef main() {\n  f0(0);\n}"
+
+
+def bench_deep_eval():
+    """Deep expression nesting and long call chains, recursive tree walker vs iterative evaluator."""
+    for label, program, depths in [("nesting", nested_expr_program, [100, 10_000, 50_000]),
+                                   ("calls", call_chain_program, [100, 10_000, 50_000])]:
+        for depth in depths:
+            ast = parse_program(program(depth))
+            timings = []
+            for backend in ["tree", "iterative"]:
+                try:
+                    elapsed = best_time(lambda: run_program(ast, backend=backend), repeat=1)
+                    timings.append(f"{backend} {elapsed * 1000:9.1f} ms")
+                except RecursionError:
+                    timings.append(f"{backend} {'RecursionError':>12}")
+            print(f"  {label:<8} {depth:>6}   " + "   ".join(timings))
+
+
+def bench_tail_calls():
+    """A 20,000-call chain where every call is in tail position, with and without elimination."""
+    depth = 20_000
+    ast = parse_program(call_chain_program(depth))
+    for backend in ["tree", "iterative", "closure", "bytecode"]:
+        for tail_calls in [False, True]:
+            label = f"{backend} {'tce' if tail_calls else 'no tce'}"
+            interpreter = Interpreter(False, None, False, backend=backend, tail_calls=tail_calls)
+            interpreter.load_program(ast)
+            if interpreter.compiler is not None and hasattr(interpreter.compiler, "compile"):
+                for func in interpreter.functions.values():
+                    interpreter.compiler.compile(func)
+            tracemalloc.start()
+            try:
+                start = time.perf_counter()
+                call_main(interpreter, 1)
+                elapsed = time.perf_counter() - start
+                peak = tracemalloc.get_traced_memory()[1]
+            except RecursionError:
+                print(f"  {label:<18} RecursionError")
+                continue
+            finally:
+                tracemalloc.stop()
+            print(f"  {label:<18} {elapsed * 1000:9.1f} ms   peak {peak / 1e6:6.2f} MB while running")
+
+
+def nested_exit_program(depth, inner, calls):
+    """f(n) runs `inner` inside `depth` nested ifs (then falls off its end); main calls f `calls` times."""
+    opening = "".join(f"{'  ' * (level + 1)}if (n > {level}) {{\n" for level in range(depth))
+    closing = "".join(f"{'  ' * (level + 1)}}}\n" for level in reversed(range(depth)))
+    body = "\n".join("  f(x);" for _ in range(calls))
+    return (f"def f(n) {{\n{opening}{'  ' * (depth + 1)}{inner};\n{closing}}}\n\n"
+            f"def main() {{\n  var x;\n  x = {depth + 1};\n{body}\n}}")
+
+
+def bench_early_return():
+    """Per-call cost of f(n) when the statement 8 ifs deep is a return vs an assignment."""
+    depth, calls, repeat = 8, 1000, 20
+    for inner in ["n = n", "return n"]:
+        print(f"  {inner}")
+        ast = parse_program(nested_exit_program(depth, inner, calls))
+        for backend in ["tree", "iterative", "closure", "bytecode"]:
+            elapsed = best_time(lambda: call_main(run_program(ast, backend=backend), repeat - 1), repeat=3)
+            print(f"    {backend:<10} {elapsed / (calls * repeat) * 1e9:8.0f} ns/call")
+
+
+def counting_loop_program(iterations, body):
+    """main runs `body` in a while loop until the counter i reaches `iterations`."""
+    return (f"def main() {{\n  var i;\n  var total;\n  i = 0;\n  total = 0;\n"
+            f"  while (i < {iterations}) {{\n{body}\n  }}\n}}")
+
+
+def countdown_program(iterations):
+    """A tail-recursive countdown from `iterations`, one call per step."""
+    return ("def count(n) {\n  if (n == 0) {\n    return 0;\n  }\n  return count(n - 1);\n}\n\n"
+            f"def main() {{\n  count({iterations});\n}}")
+
+
+def bench_loops():
+    """Iterations per second of while loops and of a tail-recursive countdown, per backend
+    (1,000,000 iterations on the compiled backends, 100,000 on the AST walkers)."""
+    bodies = {
+        "i = i + 1": "    i = i + 1;",
+        "total = total + i; i = i + 1": "    total = total + i;\n    i = i + 1;",
+    }
+    programs = {label: lambda n, body=body: counting_loop_program(n, body) for label, body in bodies.items()}
+    programs["count(n - 1) in tail position"] = countdown_program
+    for label, program in programs.items():
+        print(f"  {label}")
+        for backend in ["tree", "iterative", "closure", "bytecode"]:
+            iterations = 1_000_000 if backend in ["closure", "bytecode"] else 100_000
+            ast = parse_program(program(iterations))
+            elapsed = best_time(lambda: run_program(ast, backend=backend), repeat=3)
+            print(f"    {backend:<10} {iterations / elapsed / 1e6:6.2f} M iterations/s")
+
+
+def bench_quickening():
+    """Tree walker vs self-specializing nodes on arithmetic- and loop-heavy mains."""
+    programs = {
+        "nested arithmetic x 1000": nested_arith_program(1000),
+        "summing loop x 20000": counting_loop_program(20_000, "    total = total + i;\n    i = i + 1;"),
+    }
+    for label, program in programs.items():
+        print(f"  {label}")
+        ast = parse_program(program)
+        for backend in ["tree", "quickening"]:
+            elapsed = best_time(lambda: call_main(run_program(ast, backend=backend), 4), repeat=3)
+            print(f"    {backend:<10} {elapsed * 1000 / 5:8.1f} ms/run")
+        stats = run_program(ast, backend="quickening").stats
+        print(f"    {stats['specialized_nodes']} nodes specialized, {stats['deoptimized_nodes']} deoptimized")
+
+
+def bench_transpile():
+    """AST walker vs closures vs generated Python on loop- and call-heavy mains, and the
+    cost of loading a program with and without cached code objects."""
+    programs = {
+        "summing loop x 200000": counting_loop_program(200_000, "    total = total + i;\n    i = i + 1;"),
+        "tiny(x, 2) x 20000": call_program("tiny(x, 2)", 20_000),
+    }
+    for label, program in programs.items():
+        print(f"  {label}")
+        ast = parse_program(program)
+        for backend in ["tree", "closure", "python"]:
+            elapsed = best_time(lambda: run_program(ast, backend=backend), repeat=3)
+            print(f"    {backend:<10} {elapsed * 1000:8.1f} ms")
+
+    ast = parse_program(nested_arith_program(1000))
+    cold = best_time(lambda: (transpiler.compile_source.cache_clear(), run_program(ast, backend="python")), repeat=3)
+    warm = best_time(lambda: run_program(ast, backend="python"), repeat=3)
+    print(f"  load and run 1000 statements: {cold * 1000:.1f} ms compiling, {warm * 1000:.1f} ms from the code cache")
+
+
+def bench_tiering():
+    """Tree walker vs generated Python vs tiering, on a hot function called from a loop
+    and on a long main that runs once."""
+    programs = {
+        "tiny(x, 2) from a loop x 20000": "def tiny(a, b) {\n  var c;\n  c = a + b;\n}\n\n" + counting_loop_program(
+            20_000, "    tiny(i, 2);\n    i = i + 1;"),
+        "main of 1000 statements, run once": nested_arith_program(1000),
+    }
+    for label, program in programs.items():
+        print(f"  {label}")
+        ast = parse_program(program)
+        for backend in ["tree", "python", "tiered"]:
+            elapsed = best_time(lambda: (transpiler.compile_source.cache_clear(), run_program(ast, backend=backend)), repeat=3)
+            print(f"    {backend:<10} {elapsed * 1000:8.1f} ms")
+        for name, tier in run_program(ast, backend="tiered").stats['tiers'].items():
+            print(f"    {name}: {tier['tier']} after {tier['calls']} calls, {tier['compile_time'] * 1000:.2f} ms compiling")
+
+
+def bench_tracing():
+    """Tree walker with and without loop traces, against closures, on a counting loop with a
+    branch that is taken once (200,000 iterations)."""
+    body = "    if (i == 999) {\n      total = 0;\n    }\n    total = total + i;\n    i = i + 1;"
+    ast = parse_program(counting_loop_program(200_000, body))
+    for label, options in {"tree": {}, "tree, traced": {"trace_loops": 10}, "closure": {"backend": "closure"}}.items():
+        elapsed = best_time(lambda: run_program(ast, **options), repeat=3)
+        print(f"  {label:<14} {elapsed * 1000:8.1f} ms")
+    stats = run_program(ast, trace_loops=10).stats
+    print(f"  {stats['traced_iterations']} iterations traced, {stats['trace_exits']} side exits")
+
+
+def instruction_count(ast, backend):
+    interpreter = Interpreter(False, None, False, backend=backend)
+    interpreter.load_program(ast)
+    code_objects = [interpreter.compiler.compile(func) for func in interpreter.functions.values()]
+    return sum(len(code.code) // 2 if backend == "bytecode" else len(code.code) for code in code_objects)
+
+
+def bench_register():
+    """Stack VM vs register VM against the tree walker: instructions compiled and run time,
+    on the v1 test programs (main called 200 times each, those without inputi), an
+    arithmetic chain and a counting loop."""
+    programs = {}
+    for path in sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "v1", "tests", "*.br"))):
+        with open(path, encoding="utf-8") as handle:
+            source = handle.read()
+        if "inputi" not in source:
+            programs[os.path.basename(path)] = (source, 200)
+    programs["nested arithmetic x 1000"] = (nested_arith_program(1000), 20)
+    programs["summing loop x 20000"] = (counting_loop_program(20_000, "    total = total + i;\n    i = i + 1;"), 1)
+
+    totals = dict.fromkeys(["tree", "bytecode", "register"], 0.0)
+    print(f"  {'program':<28}{'stack ops':>10}{'reg ops':>9}{'tree ms':>10}{'stack ms':>10}{'reg ms':>9}")
+    for label, (program, calls) in programs.items():
+        ast = parse_program(program)
+        counts = [instruction_count(ast, backend) for backend in ["bytecode", "register"]]
+        timings = []
+        for backend in totals:
+            elapsed = best_time(lambda: call_main(run_program(ast, backend=backend), calls - 1), repeat=3)
+            totals[backend] += elapsed
+            timings.append(elapsed * 1000)
+        print(f"  {label:<28}{counts[0]:>10}{counts[1]:>9}" + "".join(f"{t:>10.1f}" for t in timings))
+    print("  total: " + ", ".join(f"{backend} {elapsed * 1000:.0f} ms" for backend, elapsed in totals.items()))
+
+
+def bench_peephole():
+    """Stack VM with and without superinstructions, on an arithmetic chain, a summing loop
+    and a countdown (the v1 corpus's dispatch profile is in `python peephole.py`)."""
+    programs = {
+        "nested arithmetic x 1000": nested_arith_program(1000),
+        "summing loop x 100000": counting_loop_program(100_000, "    total = total + i;\n    i = i + 1;"),
+        "count(n - 1) x 100000": countdown_program(100_000),
+    }
+    for label, program in programs.items():
+        print(f"  {label}")
+        ast = parse_program(program)
+        for peephole in [False, True]:
+            elapsed = best_time(lambda: run_program(ast, backend="bytecode", peephole=peephole), repeat=3)
+            print(f"    {'superinstructions' if peephole else 'plain bytecode':<18} {elapsed * 1000:8.1f} ms")
+
+
+def bench_threaded():
+    """Opcode dispatch vs threaded code on a long straight-line main, a summing loop and
+    a call-heavy main: tree walker, register VM and threaded register code."""
+    programs = {
+        "nested arithmetic x 1000": (nested_arith_program(1000), 20),
+        "summing loop x 100000": (counting_loop_program(100_000, "    total = total + i;\n    i = i + 1;"), 1),
+        "tiny(x, 1) x 20000": (call_program("tiny(x, 1)", 20_000), 1),
+    }
+    for label, (program, calls) in programs.items():
+        print(f"  {label}")
+        ast = parse_program(program)
+        for backend in ["tree", "register", "threaded"]:
+            elapsed = best_time(lambda: call_main(run_program(ast, backend=backend), calls - 1), repeat=3)
+            print(f"    {backend:<10} {elapsed * 1000:8.1f} ms")
+
+
+BENCHMARKS = {
+    "arith_backends": bench_arith_backends,
+    "temporaries": bench_temporaries,
+    "value_memory": bench_value_memory,
+    "interning": bench_interning,
+    "unboxed_arith": bench_unboxed_arith,
+    "call_protocol": bench_call_protocol,
+    "call_depth": bench_call_depth,
+    "binding": bench_binding,
+    "scoping": bench_scoping,
+    "frame_pool": bench_frame_pool,
+    "deep_eval": bench_deep_eval,
+    "tail_calls": bench_tail_calls,
+    "early_return": bench_early_return,
+    "loops": bench_loops,
+    "quickening": bench_quickening,
+    "transpile": bench_transpile,
+    "tiering": bench_tiering,
+    "tracing": bench_tracing,
+    "register": bench_register,
+    "peephole": bench_peephole,
+    "threaded": bench_threaded,
+}
+
+
+def main():
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        print(f"{name}: {BENCHMARKS[name].__doc__}")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main()
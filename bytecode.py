@@ -0,0 +1,561 @@
+"""
+Bytecode compiler, stack VM and disassembler for Brewin function bodies.
+
+A function body is lowered to a CodeObject: a flat list of (opcode, argument) pairs
+plus constant, name and cell tables. The VM executes it in a single dispatch loop.
+
+Usage: python bytecode.py program.br [--scoping=static]    (prints the disassembly of every function)
+"""
+
+import sys
+
+from intbase import InterpreterBase, ErrorType
+from environment import Environment, ENV_STATUS, ScopeRule
+from element import Element
+from objects import *
+
+# Opcodes; the argument of each instruction is an index into the named table, or unused
+LOAD_CONST = 0      # consts
+LOAD_NAME = 1       # names
+STORE_NAME = 2      # names
+DEFINE_FAST = 3     # varnames (frame slot)
+BINARY_ADD = 4
+BINARY_SUB = 5
+NEGATE = 6
+CALL_PRINT = 7      # argument count
+CALL_INPUTI = 8     # argument count
+CALL_FUNCTION = 9   # argument count; the callee sits below the arguments
+POP_TOP = 10
+LOAD_FUNCTION = 11  # names
+RETURN_NONE = 12
+LOAD_FAST = 13      # varnames
+STORE_FAST = 14     # varnames
+LOAD_DEREF = 15     # cells (static scoping: name, depth, slot)
+STORE_DEREF = 16    # cells
+LOAD_FUNCTION_DEREF = 17  # cells
+TAIL_CALL = 18      # argument count; like CALL_FUNCTION, but replaces the current frame
+RETURN_VALUE = 19
+COMPARE_OP = 20     # index into COMPARE_OPS
+POP_JUMP_IF_FALSE = 21  # jump target; the popped condition must be a Bool
+JUMP = 22           # jump target
+CLEAR_FAST = 23     # varnames; unbinds a block's var when the block ends
+DISCARD_TAIL_CALL = 24  # argument count; a TAIL_CALL made as a statement, so the caller's result stays nil
+
+# Superinstructions, emitted only by the peephole pass (peephole.py); their argument
+# is a tuple of the arguments of the instructions they replace
+INC_FAST = 25               # (slot, delta, operator): LOAD_FAST, LOAD_CONST, BINARY_ADD/SUB, STORE_FAST
+LOAD_FAST_LOAD_FAST = 26    # (slot, slot)
+LOAD_FAST_LOAD_CONST = 27   # (slot, const)
+ADD_STORE_FAST = 28         # (slot,): BINARY_ADD, STORE_FAST
+COMPARE_JUMP = 29           # (compare op, jump target): COMPARE_OP, POP_JUMP_IF_FALSE
+PRINT_CONST = 30            # (const,): LOAD_CONST, CALL_PRINT 1, POP_TOP
+
+OPNAMES = [
+    "LOAD_CONST", "LOAD_NAME", "STORE_NAME", "DEFINE_FAST", "BINARY_ADD", "BINARY_SUB",
+    "NEGATE", "CALL_PRINT", "CALL_INPUTI", "CALL_FUNCTION", "POP_TOP", "LOAD_FUNCTION",
+    "RETURN_NONE", "LOAD_FAST", "STORE_FAST", "LOAD_DEREF", "STORE_DEREF", "LOAD_FUNCTION_DEREF",
+    "TAIL_CALL", "RETURN_VALUE", "COMPARE_OP", "POP_JUMP_IF_FALSE", "JUMP", "CLEAR_FAST",
+    "DISCARD_TAIL_CALL", "INC_FAST", "LOAD_FAST_LOAD_FAST", "LOAD_FAST_LOAD_CONST", "ADD_STORE_FAST", "COMPARE_JUMP",
+    "PRINT_CONST",
+]
+
+COMPARE_OPS = list(COMPARISONS)
+
+HAS_CONST = {LOAD_CONST}
+HAS_NAME = {LOAD_NAME, STORE_NAME, LOAD_FUNCTION}
+HAS_COUNT = {CALL_PRINT, CALL_INPUTI, CALL_FUNCTION, TAIL_CALL, DISCARD_TAIL_CALL}
+HAS_LOCAL = {LOAD_FAST, STORE_FAST, DEFINE_FAST, CLEAR_FAST}
+HAS_CELL = {LOAD_DEREF, STORE_DEREF, LOAD_FUNCTION_DEREF}
+HAS_JUMP = {POP_JUMP_IF_FALSE, JUMP}
+HAS_SLOTS = {LOAD_FAST_LOAD_FAST, ADD_STORE_FAST}
+
+
+class CodeObject:
+    def __init__(self, name, code, consts, names, varnames, cells):
+        self.name = name
+        self.code = code
+        self.consts = consts
+        self.names = names
+        self.varnames = varnames
+        self.cells = cells
+
+
+class Compiler:
+    """Lowers the statements of one function to a CodeObject.
+
+    Locals of the function's resolver Scope are addressed by slot (the *_FAST opcodes),
+    except a name declared in more than one block, which is looked up by name. Under
+    static scoping other names are addressed by (depth, slot) through the cell table
+    (the *_DEREF opcodes); under dynamic scoping they go through the Environment by name.
+    """
+
+    def __init__(self, scope, name="<body>", scope_rule=ScopeRule.DYNAMIC):
+        self.scope = scope
+        self.name = name
+        self.static = scope_rule is ScopeRule.STATIC and scope.parent is not None
+        self.code = []
+        self.consts = []
+        self.names = []
+        self.cells = []
+
+    def emit(self, op, arg=0):
+        self.code.append(op)
+        self.code.append(arg)
+
+    def const_index(self, value):
+        for i, const in enumerate(self.consts):
+            if const is value:
+                return i
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def name_index(self, name):
+        if name not in self.names:
+            self.names.append(name)
+        return self.names.index(name)
+
+    def cell_index(self, identifier):
+        """Index of identifier's (name, depth, slot) cell, or None if it has no address."""
+        address = self.scope.parent.address(identifier) if self.static and identifier not in self.scope else None
+        if address is None:
+            return None
+        cell = (identifier, address[0] + 1, address[1])
+        if cell not in self.cells:
+            self.cells.append(cell)
+        return self.cells.index(cell)
+
+    def emit_name_op(self, fast_op, name_op, deref_op, identifier):
+        slot = self.scope.slot(identifier)
+        if slot is not None:
+            self.emit(fast_op, slot)
+            return
+
+        cell = self.cell_index(identifier)
+        if cell is None:
+            self.emit(name_op, self.name_index(identifier))
+        else:
+            self.emit(deref_op, cell)
+
+    def compile_function(self, statements) -> CodeObject:
+        for statement in statements:
+            self.compile_statement(statement)
+        self.emit(RETURN_NONE)
+        return CodeObject(self.name, self.code, self.consts, self.names, self.scope.names, self.cells)
+
+    def compile_block(self, statements):
+        # a nested block's vars are unbound again when it ends
+        for statement in statements:
+            self.compile_statement(statement)
+        for slot in dict.fromkeys(statement.slot for statement in statements
+                                  if statement.elem_type == InterpreterBase.VAR_DEF_NODE):
+            self.emit(CLEAR_FAST, slot)
+
+    def patch(self, at):
+        # points the forward jump emitted at `at` to the next instruction
+        self.code[at + 1] = len(self.code)
+
+    def compile_statement(self, node: Element):
+        match node.elem_type:
+            case InterpreterBase.VAR_DEF_NODE:
+                self.emit(DEFINE_FAST, node.slot)
+            case InterpreterBase.ASSIGNMENT_NODE:
+                self.compile_expr(node.get('expression'))
+                self.emit_name_op(STORE_FAST, STORE_NAME, STORE_DEREF, node.get('var'))
+            case InterpreterBase.FCALL_NODE:
+                self.compile_fcall(node)
+                if not node.tail:
+                    self.emit(POP_TOP)
+            case InterpreterBase.IF_NODE:
+                self.compile_expr(node.get('condition'))
+                jump_if_false = len(self.code)
+                self.emit(POP_JUMP_IF_FALSE)
+                self.compile_block(node.get('statements'))
+                if node.get('else_statements'):
+                    jump = len(self.code)
+                    self.emit(JUMP)
+                    self.patch(jump_if_false)
+                    self.compile_block(node.get('else_statements'))
+                    self.patch(jump)
+                else:
+                    self.patch(jump_if_false)
+            case InterpreterBase.WHILE_NODE:
+                top = len(self.code)
+                self.compile_expr(node.get('condition'))
+                jump_if_false = len(self.code)
+                self.emit(POP_JUMP_IF_FALSE)
+                self.compile_block(node.get('statements'))
+                self.emit(JUMP, top)
+                self.patch(jump_if_false)
+            case InterpreterBase.RETURN_NODE:
+                expression = node.get('expression')
+                if expression is None:
+                    self.emit(RETURN_NONE)
+                elif expression.elem_type == InterpreterBase.FCALL_NODE and expression.tail:
+                    self.compile_fcall(expression)
+                else:
+                    self.compile_expr(expression)
+                    self.emit(RETURN_VALUE)
+
+    def compile_expr(self, node: Element):
+        element_type = node.elem_type
+
+        if element_type in ['+', '-']:
+            self.compile_expr(node.get('op1'))
+            self.compile_expr(node.get('op2'))
+            self.emit(BINARY_ADD if element_type == '+' else BINARY_SUB)
+        elif element_type in COMPARISONS:
+            self.compile_expr(node.get('op1'))
+            self.compile_expr(node.get('op2'))
+            self.emit(COMPARE_OP, COMPARE_OPS.index(element_type))
+        elif element_type == InterpreterBase.FCALL_NODE:
+            self.compile_fcall(node)
+        elif element_type == InterpreterBase.QUALIFIED_NAME_NODE:
+            self.emit_name_op(LOAD_FAST, LOAD_NAME, LOAD_DEREF, node.get('name'))
+        elif element_type == InterpreterBase.NEG_NODE:
+            self.emit(NEGATE)
+        elif element_type in [InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE]:
+            self.emit(LOAD_CONST, self.const_index(node.const))
+        else:
+            self.emit(LOAD_CONST, self.const_index(None))
+
+    def compile_fcall(self, node: Element):
+        identifier = node.get('name')
+        args = node.get('args')
+        is_builtin = identifier in ('print', 'inputi')
+
+        if node.func is not None:
+            self.emit(LOAD_CONST, self.const_index(node.func))
+        elif not is_builtin:
+            cell = self.cell_index(identifier)
+            if cell is None:
+                self.emit(LOAD_FUNCTION, self.name_index(identifier))
+            else:
+                self.emit(LOAD_FUNCTION_DEREF, cell)
+        for arg in args:
+            self.compile_expr(arg)
+
+        if is_builtin:
+            self.emit(CALL_PRINT if identifier == 'print' else CALL_INPUTI, len(args))
+        else:
+            self.emit((DISCARD_TAIL_CALL if node.discard else TAIL_CALL) if node.tail else CALL_FUNCTION, len(args))
+
+
+class VirtualMachine:
+    """Executes CodeObjects against the interpreter's Environment.
+
+    Calls between Brewin functions are handled inside the dispatch loop with an explicit
+    stack of suspended VM frames, so they do not recurse on the Python stack.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.env = interpreter.env
+
+    def run(self, func: FunctionObject):
+        return self.execute(self.compile(func), self.env.current_frame.slots)
+
+    def compile(self, func: FunctionObject) -> CodeObject:
+        if func.compiled is None:
+            func.compiled = Compiler(func.scope, func.get('name'), self.env.scope_rule).compile_function(func.statements)
+            if self.interpreter.peephole:
+                from peephole import optimize
+                self.interpreter.stats['superinstructions'] += optimize(func.compiled)
+        return func.compiled
+
+    def execute(self, code_object: CodeObject, slots):
+        env, interpreter, error = self.env, self.interpreter, self.interpreter.error
+        create_object, boolean, boxed_int = Environment.create_object, Environment.interned.bool, Environment.interned.int
+        comparisons = [COMPARISONS[operator] for operator in COMPARE_OPS]
+        code, consts, names, varnames, cells = code_object.code, code_object.consts, code_object.names, code_object.varnames, code_object.cells
+        frame_at = env.frame_at
+        stack = []
+        push, pop = stack.append, stack.pop
+        pc = 0
+        callers = []
+
+        while True:
+            op = code[pc]
+            arg = code[pc + 1]
+            pc += 2
+
+            if op == LOAD_CONST:
+                push(consts[arg])
+            elif op == LOAD_FAST_LOAD_CONST:
+                slot, const = arg
+                value = slots[slot]
+                if value is ENV_STATUS.IDENTIFIER_NOT_FOUND or value is OBJECT_TYPES.UNINITIALIZED:
+                    value = load_slot(env, error, slots, varnames, slot)
+                push(value)
+                push(consts[const])
+            elif op == INC_FAST:
+                slot, delta, operator = arg
+                value = slots[slot]
+                if type(value) is Int:
+                    slots[slot] = boxed_int(value.value + delta)
+                else:
+                    value = load_slot(env, error, slots, varnames, slot)
+                    if not isinstance(value, Int):
+                        error(ErrorType.TYPE_ERROR, f'{operator} operation can only be applied to ints')
+                    store_slot(env, error, slots, varnames, slot, boxed_int(value.value + delta))
+            elif op == COMPARE_JUMP:
+                operator, target = arg
+                val2 = pop()
+                val1 = pop()
+                if type(val1) is Int and type(val2) is Int:
+                    if not comparisons[operator](val1.value, val2.value):
+                        pc = target
+                elif not interpreter.compare(COMPARE_OPS[operator], val1, val2).value:
+                    pc = target
+            elif op == LOAD_FAST_LOAD_FAST:
+                for slot in arg:
+                    value = slots[slot]
+                    if value is ENV_STATUS.IDENTIFIER_NOT_FOUND or value is OBJECT_TYPES.UNINITIALIZED:
+                        value = load_slot(env, error, slots, varnames, slot)
+                    push(value)
+            elif op == ADD_STORE_FAST:
+                val2 = pop()
+                val1 = pop()
+                if not isinstance(val1, Int) or not isinstance(val2, Int):
+                    error(ErrorType.TYPE_ERROR, '+ operation can only be applied to ints')
+                store_slot(env, error, slots, varnames, arg[0], boxed_int(val1.value + val2.value))
+            elif op == PRINT_CONST:
+                interpreter.output(str(consts[arg[0]]))
+            elif op == LOAD_FAST:
+                value = slots[arg]
+                if value is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    # the var statement has not run in this frame; fall back to callers
+                    value = env.retrieve(identifier=varnames[arg])
+                if value is OBJECT_TYPES.UNINITIALIZED:
+                    error(ErrorType.NAME_ERROR, f'Variable {varnames[arg]} was defined but not initialized')
+                elif value is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f"Variable {varnames[arg]} has not been defined")
+                push(value)
+            elif op == STORE_FAST:
+                if slots[arg] is not ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    slots[arg] = pop()
+                elif env.assign_identifier(identifier=varnames[arg], value=pop()) == ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'Variable {varnames[arg]} has not been defined')
+            elif op == LOAD_NAME:
+                identifier = names[arg]
+                value = env.retrieve(identifier=identifier)
+                if value is OBJECT_TYPES.UNINITIALIZED:
+                    error(ErrorType.NAME_ERROR, f'Variable {identifier} was defined but not initialized')
+                elif value is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f"Variable {identifier} has not been defined")
+                push(value)
+            elif op == BINARY_ADD or op == BINARY_SUB:
+                val2 = pop()
+                val1 = pop()
+                if not isinstance(val1, Int) or not isinstance(val2, Int):
+                    error(ErrorType.TYPE_ERROR, f"{'+' if op == BINARY_ADD else '-'} operation can only be applied to ints")
+                value = val1 + val2 if op == BINARY_ADD else val1 - val2
+                push(create_object(name="", node=None, env=env, value=value, obj_type=OBJECT_TYPES.INT))
+            elif op == POP_JUMP_IF_FALSE:
+                condition = pop()
+                if type(condition) is not Bool:
+                    error(ErrorType.TYPE_ERROR, 'Condition of if or while must be a bool')
+                if not condition.value:
+                    pc = arg
+            elif op == COMPARE_OP:
+                val2 = pop()
+                val1 = pop()
+                if type(val1) is Int and type(val2) is Int:
+                    push(boolean(comparisons[arg](val1.value, val2.value)))
+                else:
+                    push(interpreter.compare(COMPARE_OPS[arg], val1, val2))
+            elif op == JUMP:
+                pc = arg
+            elif op == RETURN_VALUE:
+                value = pop()
+                if env.current_frame.discard:
+                    value = None
+                if not callers:
+                    return value
+                env.pop_frame()
+                code, consts, names, varnames, cells, pc, stack, slots = callers.pop()
+                push, pop = stack.append, stack.pop
+                push(value)
+            elif op == CLEAR_FAST:
+                slots[arg] = ENV_STATUS.IDENTIFIER_NOT_FOUND
+            elif op == STORE_NAME:
+                identifier = names[arg]
+                if env.assign_identifier(identifier=identifier, value=pop()) == ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'Variable {identifier} has not been defined')
+            elif op == DEFINE_FAST:
+                if slots[arg] is not ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'Redefinition of {varnames[arg]}')
+                slots[arg] = OBJECT_TYPES.UNINITIALIZED
+            elif op == POP_TOP:
+                pop()
+            elif op == CALL_PRINT:
+                values = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                interpreter.output("".join(str(value) for value in values))
+                push(None)
+            elif op == LOAD_FUNCTION:
+                identifier = names[arg]
+                func = env.retrieve(identifier=identifier)
+                if type(func) is not FunctionObject:
+                    if func is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                        error(ErrorType.NAME_ERROR, f'{identifier} is not defined')
+                    error(ErrorType.TYPE_ERROR, f'{identifier} is not callable')
+                push(func)
+            elif op == CALL_FUNCTION:
+                args = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                func = pop()
+                if arg != func.arity:
+                    error(ErrorType.NAME_ERROR, f'{func.name}() takes {func.arity} arguments but {arg} were given')
+
+                callers.append((code, consts, names, varnames, cells, pc, stack, slots))
+                env.push_frame(lexical_parent=func.lexical_parent, scope=func.scope)
+                slots = env.current_frame.slots
+                slots[:arg] = args
+
+                code_object = func.compiled or self.compile(func)
+                code, consts, names, varnames, cells = code_object.code, code_object.consts, code_object.names, code_object.varnames, code_object.cells
+                stack = []
+                push, pop = stack.append, stack.pop
+                pc = 0
+            elif op == TAIL_CALL or op == DISCARD_TAIL_CALL:
+                args = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                func = pop()
+                if arg != func.arity:
+                    error(ErrorType.NAME_ERROR, f'{func.name}() takes {func.arity} arguments but {arg} were given')
+
+                # the callee takes over this frame's place; callers is left as it is
+                discard = op == DISCARD_TAIL_CALL or env.current_frame.discard
+                env.pop_frame()
+                env.push_frame(lexical_parent=func.lexical_parent, scope=func.scope)
+                env.current_frame.discard = discard
+                slots = env.current_frame.slots
+                slots[:arg] = args
+
+                code_object = func.compiled or self.compile(func)
+                code, consts, names, varnames, cells = code_object.code, code_object.consts, code_object.names, code_object.varnames, code_object.cells
+                stack = []
+                push, pop = stack.append, stack.pop
+                pc = 0
+            elif op == RETURN_NONE:
+                if not callers:
+                    return None
+                env.pop_frame()
+                code, consts, names, varnames, cells, pc, stack, slots = callers.pop()
+                push, pop = stack.append, stack.pop
+                push(None)
+            elif op == LOAD_DEREF:
+                identifier, depth, slot = cells[arg]
+                value = frame_at(depth).slots[slot]
+                if value is OBJECT_TYPES.UNINITIALIZED:
+                    error(ErrorType.NAME_ERROR, f'Variable {identifier} was defined but not initialized')
+                elif value is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f"Variable {identifier} has not been defined")
+                push(value)
+            elif op == STORE_DEREF:
+                identifier, depth, slot = cells[arg]
+                target = frame_at(depth).slots
+                if target[slot] is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'Variable {identifier} has not been defined')
+                target[slot] = pop()
+            elif op == LOAD_FUNCTION_DEREF:
+                identifier, depth, slot = cells[arg]
+                func = frame_at(depth).slots[slot]
+                if type(func) is not FunctionObject:
+                    if func is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                        error(ErrorType.NAME_ERROR, f'{identifier} is not defined')
+                    error(ErrorType.TYPE_ERROR, f'{identifier} is not callable')
+                push(func)
+            elif op == CALL_INPUTI:
+                values = stack[len(stack) - arg:]
+                del stack[len(stack) - arg:]
+                push(interpreter.call_builtin('inputi', values))
+            elif op == NEGATE:
+                error(ErrorType.NAME_ERROR)
+
+
+def load_slot(env, error, slots, varnames, slot):
+    """LOAD_FAST's lookup of a slot that is unbound or uninitialized."""
+    value = slots[slot]
+    if value is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+        value = env.retrieve(identifier=varnames[slot])
+    if value is OBJECT_TYPES.UNINITIALIZED:
+        error(ErrorType.NAME_ERROR, f'Variable {varnames[slot]} was defined but not initialized')
+    elif value is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+        error(ErrorType.NAME_ERROR, f"Variable {varnames[slot]} has not been defined")
+    return value
+
+
+def store_slot(env, error, slots, varnames, slot, value):
+    """STORE_FAST: into the slot if its var statement has run, else by name."""
+    if slots[slot] is not ENV_STATUS.IDENTIFIER_NOT_FOUND:
+        slots[slot] = value
+    elif env.assign_identifier(identifier=varnames[slot], value=value) == ENV_STATUS.IDENTIFIER_NOT_FOUND:
+        error(ErrorType.NAME_ERROR, f'Variable {varnames[slot]} has not been defined')
+
+
+def const_repr(value):
+    if isinstance(value, FunctionObject):
+        return f"<function {value.name}>"
+    if isinstance(value, ObjectInterface):
+        return repr(value.value)
+    return repr(value)
+
+
+def disassemble(code_object: CodeObject) -> str:
+    lines = []
+    code = code_object.code
+    for pc in range(0, len(code), 2):
+        op, arg = code[pc], code[pc + 1]
+        line = f"{pc:>6} {OPNAMES[op]:<20}"
+        if op in HAS_CONST:
+            line += f"{arg:>4} ({const_repr(code_object.consts[arg])})"
+        elif op in HAS_NAME:
+            line += f"{arg:>4} ({code_object.names[arg]})"
+        elif op in HAS_LOCAL:
+            line += f"{arg:>4} ({code_object.varnames[arg]})"
+        elif op in HAS_CELL:
+            identifier, depth, slot = code_object.cells[arg]
+            line += f"{arg:>4} ({identifier} @ depth {depth}, slot {slot})"
+        elif op in HAS_JUMP:
+            line += f"{arg:>4} (to {arg})"
+        elif op == INC_FAST:
+            line += f"{arg[0]:>4} ({code_object.varnames[arg[0]]} {arg[2]}= {arg[1] if arg[2] == '+' else -arg[1]})"
+        elif op in HAS_SLOTS:
+            line += f"     ({', '.join(code_object.varnames[slot] for slot in arg)})"
+        elif op == LOAD_FAST_LOAD_CONST:
+            line += f"     ({code_object.varnames[arg[0]]}, {const_repr(code_object.consts[arg[1]])})"
+        elif op == COMPARE_JUMP:
+            line += f"{arg[1]:>4} ({COMPARE_OPS[arg[0]]}, to {arg[1]})"
+        elif op == PRINT_CONST:
+            line += f"{arg[0]:>4} ({const_repr(code_object.consts[arg[0]])})"
+        elif op == COMPARE_OP:
+            line += f"{arg:>4} ({COMPARE_OPS[arg]})"
+        elif op in HAS_COUNT:
+            line += f"{arg:>4}"
+        lines.append(line.rstrip())
+    return "\n".join(lines)
+
+
+def main():
+    from brewparse import parse_program
+    from interpreterv1 import Interpreter
+
+    with open(sys.argv[1], encoding="utf-8") as handle:
+        program_node = parse_program(handle.read())
+
+    scoping = "static" if "--scoping=static" in sys.argv[2:] else "dynamic"
+    interpreter = Interpreter(backend="bytecode", scoping=scoping)
+    interpreter.load_program(program_node)
+    for func in interpreter.functions.values():
+        code_object = interpreter.compiler.compile(func)
+        print(f"Disassembly of {code_object.name}():")
+        print(disassemble(code_object))
+        print(f"  consts:   [{', '.join(const_repr(const) for const in code_object.consts)}]")
+        print(f"  names:    {code_object.names!r}")
+        print(f"  varnames: {code_object.varnames!r}")
+        print(f"  cells:    {code_object.cells!r}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,567 @@
+from functools import partial
+
+from intbase import InterpreterBase, ErrorType
+from environment import Environment, ENV_STATUS, ScopeRule, CONTROL
+from element import Element
+from objects import *
+
+
+class ClosureCompiler:
+    """Compiles function bodies into nested Python closures.
+
+    Every AST node is visited exactly once, at compile time; the closure built for it
+    captures its already-compiled children, so running a function is just a chain of
+    closure calls with no elem_type dispatch or Element.get lookups.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.env = interpreter.env
+        # Set by a statement closure that returns CONTROL.RETURN or CONTROL.TAIL_CALL
+        self.result = None
+        self.pending = None
+
+    def run(self, func: FunctionObject):
+        # A tail call leaves (callee, args, discard) in self.pending instead of making the
+        # call; the callee replaces the current frame and runs in this loop
+        status = self.compile(func)(self.env.current_frame.slots)
+        while status is CONTROL.TAIL_CALL:
+            func = self.pending[0]
+            self.interpreter.replace_frame(*self.pending)
+            status = self.compile(func)(self.env.current_frame.slots)
+        return self.result if status is CONTROL.RETURN else None
+
+    def compile(self, func: FunctionObject):
+        if func.compiled is None:
+            func.compiled = self.compile_block(func.statements, func.scope)
+        return func.compiled
+
+    def compile_block(self, statements, scope, nested=False):
+        """Compiles statements into a closure returning the CONTROL status of the one that
+        left the function, or None. Only statements that can leave are checked: the
+        others run in plain loops between them. A nested block clears the slots of its
+        vars on the way out, so they are undefined again after it."""
+        segments, plain = [], []
+        for statement in statements:
+            compiled = self.compile_statement(statement, scope)
+            if compiled is None:
+                continue
+            if self.exits(statement):
+                segments.append((tuple(plain), compiled))
+                plain = []
+            else:
+                plain.append(compiled)
+        segments.append((tuple(plain), None))
+
+        cleared = []
+        if nested:
+            cleared = list(dict.fromkeys(statement.slot for statement in statements
+                                         if statement.elem_type == InterpreterBase.VAR_DEF_NODE))
+        unbound = ENV_STATUS.IDENTIFIER_NOT_FOUND
+
+        if len(segments) == 1:
+            plain = segments[0][0]
+
+            def block(slots):
+                for statement in plain:
+                    statement(slots)
+                for slot in cleared:
+                    slots[slot] = unbound
+        else:
+            def block(slots):
+                for plain, exiting in segments:
+                    for statement in plain:
+                        statement(slots)
+                    if exiting is not None:
+                        status = exiting(slots)
+                        if status is not None:
+                            for slot in cleared:
+                                slots[slot] = unbound
+                            return status
+                for slot in cleared:
+                    slots[slot] = unbound
+
+        return block
+
+    @classmethod
+    def exits(cls, node: Element) -> bool:
+        """Whether a statement can return a CONTROL status."""
+        if node.elem_type == InterpreterBase.RETURN_NODE:
+            return True
+        if node.elem_type == InterpreterBase.FCALL_NODE:
+            return node.tail
+        if node.elem_type in [InterpreterBase.IF_NODE, InterpreterBase.WHILE_NODE]:
+            return any(cls.exits(statement) for statement in node.get('statements') + (node.get('else_statements') or []))
+        return False
+
+    def compile_statement(self, node: Element, scope):
+        match node.elem_type:
+            case InterpreterBase.VAR_DEF_NODE:
+                return self.compile_vardef(node, scope)
+            case InterpreterBase.ASSIGNMENT_NODE:
+                return self.compile_assign(node, scope)
+            case InterpreterBase.FCALL_NODE if node.tail:
+                return self.compile_tail_call(node, scope)
+            case InterpreterBase.FCALL_NODE:
+                return self.compile_fcall(node, scope)
+            case InterpreterBase.IF_NODE:
+                return self.compile_if(node, scope)
+            case InterpreterBase.WHILE_NODE:
+                return self.compile_while(node, scope)
+            case InterpreterBase.RETURN_NODE:
+                return self.compile_return(node, scope)
+        return None
+
+    def compile_if(self, node: Element, scope):
+        condition = self.compile_condition(node.get('condition'), scope, 'if')
+        then_block = self.compile_block(node.get('statements'), scope, nested=True)
+        else_statements = node.get('else_statements')
+        if not else_statements:
+            def if_(slots):
+                if condition(slots):
+                    return then_block(slots)
+        else:
+            else_block = self.compile_block(else_statements, scope, nested=True)
+
+            def if_(slots):
+                if condition(slots):
+                    return then_block(slots)
+                return else_block(slots)
+
+        return if_
+
+    def compile_while(self, node: Element, scope):
+        # condition and body are compiled once and run from a Python while loop
+        condition = self.compile_condition(node.get('condition'), scope, 'while')
+        statements = node.get('statements')
+        if self.exits(node):
+            body = self.compile_block(statements, scope, nested=True)
+
+            def while_(slots):
+                while condition(slots):
+                    status = body(slots)
+                    if status is not None:
+                        return status
+
+            return while_
+
+        if any(statement.elem_type == InterpreterBase.VAR_DEF_NODE for statement in statements):
+            # the block clears its vars at the end of every iteration
+            body = (self.compile_block(statements, scope, nested=True),)
+        else:
+            # nothing to clear and nothing can leave: the statements run inline
+            body = tuple(compiled for compiled in (self.compile_statement(statement, scope) for statement in statements)
+                         if compiled is not None)
+
+        test = node.get('condition')
+        slot = self.local_slot(test.get('op1'), scope) if test.elem_type in COMPARISONS else None
+        if slot is not None and test.get('op2').elem_type == InterpreterBase.INT_NODE:
+            # the usual counting loop, `while (i < 100) {...}`: the test on the local is
+            # inlined, and condition() only runs when the slot does not hold an Int
+            compare, bound = COMPARISONS[test.elem_type], test.get('op2').get('val')
+
+            def while_(slots):
+                while True:
+                    value = slots[slot]
+                    if type(value) is Int:
+                        if not compare(value.value, bound):
+                            return
+                    elif not condition(slots):
+                        return
+                    for statement in body:
+                        statement(slots)
+        else:
+            def while_(slots):
+                while condition(slots):
+                    for statement in body:
+                        statement(slots)
+
+        return while_
+
+    def compile_return(self, node: Element, scope):
+        expression = node.get('expression')
+        if expression is not None and expression.elem_type == InterpreterBase.FCALL_NODE and expression.tail:
+            return self.compile_tail_call(expression, scope)
+
+        value = self.compile_expr(expression, scope) if expression is not None else lambda slots: None
+
+        def return_(slots):
+            self.result = value(slots)
+            return CONTROL.RETURN
+
+        return return_
+
+    def compile_vardef(self, node: Element, scope):
+        error = self.interpreter.error
+        identifier = node.get('name')
+        slot = node.slot
+
+        def vardef(slots):
+            if slots[slot] is not ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                error(ErrorType.NAME_ERROR, f'Redefinition of {identifier}')
+            slots[slot] = OBJECT_TYPES.UNINITIALIZED
+
+        return vardef
+
+    def compile_assign(self, node: Element, scope):
+        env, error = self.env, self.interpreter.error
+        identifier = node.get('var')
+        slot = scope.slot(identifier)
+        expression_node = node.get('expression')
+
+        if slot is None:
+            expression = self.compile_expr(expression_node, scope)
+            store = self.nonlocal_store(identifier, scope)
+
+            def assign(slots):
+                if store(expression(slots)) is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'Variable {identifier} has not been defined')
+        elif self.produces_int(expression_node):
+            # the raw int is boxed here, with the intern table's lookup inlined, rather
+            # than by a wrapping closure
+            raw = self.compile_int(expression_node, scope)
+            interned = Environment.interned
+            ints, low, high = interned.ints, interned.low, interned.high
+
+            def assign(slots):
+                value = raw(slots)
+                value = ints[value - low] if low <= value <= high else Int(None, value)
+                if slots[slot] is not ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    slots[slot] = value
+                elif env.assign_identifier(identifier=identifier, value=value) == ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'Variable {identifier} has not been defined')
+
+            if expression_node.elem_type in ['+', '-'] and self.local_slot(expression_node.get('op1'), scope) == slot \
+                    and expression_node.get('op2').elem_type == InterpreterBase.INT_NODE:
+                # a counter update, `i = i + 1`: an Int in the slot is stepped in place
+                # and anything else goes through the assignment above
+                general, step = assign, expression_node.get('op2').get('val')
+                if expression_node.elem_type == '-':
+                    step = -step
+
+                def assign(slots):
+                    value = slots[slot]
+                    if type(value) is Int:
+                        value = value.value + step
+                        slots[slot] = ints[value - low] if low <= value <= high else Int(None, value)
+                    else:
+                        general(slots)
+        else:
+            expression = self.compile_expr(expression_node, scope)
+
+            # a local whose var statement has not run yet is looked up by name
+            def assign(slots):
+                value = expression(slots)
+                if slots[slot] is not ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    slots[slot] = value
+                elif env.assign_identifier(identifier=identifier, value=value) == ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'Variable {identifier} has not been defined')
+
+        return assign
+
+    def nonlocal_address(self, identifier, scope):
+        """(depth, slot) of a name outside the function's locals under static scoping,
+        with depth counted from the function's own frame, or None to look it up by name."""
+        if self.env.scope_rule is not ScopeRule.STATIC or scope.parent is None or identifier in scope:
+            return None
+        address = scope.parent.address(identifier)
+        return None if address is None else (address[0] + 1, address[1])
+
+    def nonlocal_load(self, identifier, scope):
+        address = self.nonlocal_address(identifier, scope)
+        if address is None:
+            return partial(self.env.retrieve, identifier)
+
+        frame_at, (depth, slot) = self.env.frame_at, address
+        return lambda: frame_at(depth).slots[slot]
+
+    def nonlocal_store(self, identifier, scope):
+        address = self.nonlocal_address(identifier, scope)
+        if address is None:
+            return partial(self.env.assign_identifier, identifier)
+
+        frame_at, (depth, slot) = self.env.frame_at, address
+
+        def store(value):
+            slots = frame_at(depth).slots
+            if slots[slot] is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                return ENV_STATUS.IDENTIFIER_NOT_FOUND
+            slots[slot] = value
+            return ENV_STATUS.SUCCESS
+
+        return store
+
+    def compile_expr(self, node: Element, scope):
+        env, error = self.env, self.interpreter.error
+        element_type = node.elem_type
+
+        if element_type in ['+', '-']:
+            # the operator chain runs on raw ints; only the finished value is boxed
+            raw = self.compile_int(node, scope)
+            box = Environment.interned.int
+
+            def binary_op(slots):
+                return box(raw(slots))
+
+            return binary_op
+        elif element_type in COMPARISONS:
+            raw = self.compile_compare(node, scope)
+            box = Environment.interned.bool
+
+            def compare(slots):
+                return box(raw(slots))
+
+            return compare
+        elif element_type == InterpreterBase.FCALL_NODE:
+            return self.compile_fcall(node, scope)
+        elif element_type == InterpreterBase.QUALIFIED_NAME_NODE:
+            return self.compile_load(node.get('name'), scope)
+        elif element_type == InterpreterBase.NEG_NODE:
+            def neg(slots):
+                error(ErrorType.NAME_ERROR)
+
+            return neg
+        elif element_type in [InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE]:
+            value = node.const
+
+            def literal(slots):
+                return value
+
+            return literal
+
+        return lambda slots: None
+
+    def compile_condition(self, node: Element, scope, statement):
+        """Compiles the condition of an if or while to a closure returning a native
+        Python bool, raising TYPE_ERROR for a value that is not a Bool."""
+        if node.elem_type in COMPARISONS:
+            return self.compile_compare(node, scope)
+
+        error = self.interpreter.error
+        value = self.compile_expr(node, scope)
+
+        def condition(slots):
+            result = value(slots)
+            if type(result) is not Bool:
+                error(ErrorType.TYPE_ERROR, f'Condition of {statement} must be a bool')
+            return result.value
+
+        return condition
+
+    def compile_compare(self, node: Element, scope):
+        """Compiles a comparison to a closure returning a native Python bool.
+
+        Int-valued operands are compared as raw ints without boxing, and a local
+        compared with a local or an int literal reads the Int straight from its slot;
+        anything else (and a slot not holding an Int) takes the general path.
+        """
+        op1, op2 = node.get('op1'), node.get('op2')
+        compare = COMPARISONS[node.elem_type]
+        if self.produces_int(op1) and self.produces_int(op2):
+            val1 = self.compile_int(op1, scope)
+            val2 = self.compile_int(op2, scope)
+            return lambda slots: compare(val1(slots), val2(slots))
+
+        operator, compare_values = node.elem_type, self.interpreter.compare
+        operand1 = self.compile_expr(op1, scope)
+        operand2 = self.compile_expr(op2, scope)
+
+        def general(slots):
+            return compare_values(operator, operand1(slots), operand2(slots)).value
+
+        slot1, slot2 = self.local_slot(op1, scope), self.local_slot(op2, scope)
+        if slot1 is not None and slot2 is not None:
+            def compare_locals(slots):
+                val1, val2 = slots[slot1], slots[slot2]
+                if type(val1) is Int and type(val2) is Int:
+                    return compare(val1.value, val2.value)
+                return general(slots)
+
+            return compare_locals
+        if slot1 is not None and op2.elem_type == InterpreterBase.INT_NODE:
+            constant = op2.get('val')
+
+            def compare_local(slots):
+                value = slots[slot1]
+                if type(value) is Int:
+                    return compare(value.value, constant)
+                return general(slots)
+
+            return compare_local
+        if slot2 is not None and op1.elem_type == InterpreterBase.INT_NODE:
+            constant = op1.get('val')
+
+            def compare_local(slots):
+                value = slots[slot2]
+                if type(value) is Int:
+                    return compare(constant, value.value)
+                return general(slots)
+
+            return compare_local
+        return general
+
+    @staticmethod
+    def local_slot(node: Element, scope):
+        """The slot of a variable node naming a local declared once, or None."""
+        if node.elem_type != InterpreterBase.QUALIFIED_NAME_NODE:
+            return None
+        return scope.slot(node.get('name'))
+
+    @staticmethod
+    def produces_int(node: Element):
+        return node.elem_type in ['+', '-', InterpreterBase.INT_NODE]
+
+    def compile_int(self, node: Element, scope):
+        """Compiles an int-valued node (+, - or an int literal) to a closure returning a
+        native Python int rather than an Int object."""
+        if node.elem_type == InterpreterBase.INT_NODE:
+            value = node.get('val')
+            return lambda slots: value
+
+        op1, op2 = node.get('op1'), node.get('op2')
+        subtract = node.elem_type == '-'
+
+        if self.produces_int(op1) and self.produces_int(op2):
+            val1 = self.compile_int(op1, scope)
+            val2 = self.compile_int(op2, scope)
+            if subtract:
+                return lambda slots: val1(slots) - val2(slots)
+            return lambda slots: val1(slots) + val2(slots)
+
+        # Other operands yield boxed values and are type checked once both are evaluated
+        operand1 = self.compile_int(op1, scope) if self.produces_int(op1) else self.compile_expr(op1, scope)
+        operand2 = self.compile_int(op2, scope) if self.produces_int(op2) else self.compile_expr(op2, scope)
+        general = self.compile_int_op(operand1, operand2, subtract)
+
+        # A local plus or minus a literal or another local reads the Int from its slot;
+        # anything but an Int there takes the general path, which raises the errors
+        slot1, slot2 = self.local_slot(op1, scope), self.local_slot(op2, scope)
+        if slot1 is not None and op2.elem_type == InterpreterBase.INT_NODE:
+            constant = -op2.get('val') if subtract else op2.get('val')
+
+            def local_op(slots):
+                value = slots[slot1]
+                if type(value) is Int:
+                    return value.value + constant
+                return general(slots)
+
+            return local_op
+        if slot1 is not None and slot2 is not None:
+            if subtract:
+                def local_op(slots):
+                    val1, val2 = slots[slot1], slots[slot2]
+                    if type(val1) is Int and type(val2) is Int:
+                        return val1.value - val2.value
+                    return general(slots)
+            else:
+                def local_op(slots):
+                    val1, val2 = slots[slot1], slots[slot2]
+                    if type(val1) is Int and type(val2) is Int:
+                        return val1.value + val2.value
+                    return general(slots)
+
+            return local_op
+        return general
+
+    def compile_int_op(self, operand1, operand2, subtract):
+        # +/- on operands that may be boxed; a value that is not an Int is a TYPE_ERROR
+        error = self.interpreter.error
+
+        def unbox(value):
+            if type(value) is Int:
+                return value.value
+            error(ErrorType.TYPE_ERROR, '+ operation can only be applied to ints')
+
+        def binary_op(slots):
+            val1 = operand1(slots)
+            val2 = operand2(slots)
+            if type(val1) is not int:
+                val1 = unbox(val1)
+            if type(val2) is not int:
+                val2 = unbox(val2)
+            return val1 - val2 if subtract else val1 + val2
+
+        return binary_op
+
+    def compile_load(self, identifier, scope):
+        env, error = self.env, self.interpreter.error
+        slot = scope.slot(identifier)
+
+        def check(value):
+            if value is OBJECT_TYPES.UNINITIALIZED:
+                error(ErrorType.NAME_ERROR, f'Variable {identifier} was defined but not initialized')
+            elif value is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                error(ErrorType.NAME_ERROR, f"Variable {identifier} has not been defined")
+            return value
+
+        if slot is None:
+            lookup = self.nonlocal_load(identifier, scope)
+
+            def load(slots):
+                return check(lookup())
+        else:
+            def load(slots):
+                value = slots[slot]
+                if value is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    value = env.retrieve(identifier=identifier)
+                if value is OBJECT_TYPES.UNINITIALIZED or value is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    check(value)
+                return value
+
+        return load
+
+    def compile_fcall(self, node: Element, scope):
+        interpreter = self.interpreter
+        identifier = node.get('name')
+        args = [self.compile_expr(arg, scope) for arg in node.get('args')]
+
+        if identifier == 'print':
+            output = interpreter.output
+
+            def call(slots):
+                output("".join(str(arg(slots)) for arg in args))
+
+            return call
+
+        if identifier in interpreter.builtin_dict:
+            call_builtin = interpreter.call_builtin
+            return lambda slots: call_builtin(identifier, [arg(slots) for arg in args])
+
+        call_function = interpreter.call_function
+        func = node.func
+        if func is not None:
+            return lambda slots: call_function(func, [arg(slots) for arg in args])
+
+        callee = self.compile_callee(node, scope)
+        return lambda slots: call_function(callee(), [arg(slots) for arg in args])
+
+    def compile_tail_call(self, node: Element, scope):
+        callee = self.compile_callee(node, scope)
+        args = [self.compile_expr(arg, scope) for arg in node.get('args')]
+        discard = node.discard
+
+        def tail_call(slots):
+            self.pending = (callee(), [arg(slots) for arg in args], discard)
+            return CONTROL.TAIL_CALL
+
+        return tail_call
+
+    def compile_callee(self, node: Element, scope):
+        """Closure returning the FunctionObject an fcall reaches, raising the call errors."""
+        env, error = self.env, self.interpreter.error
+        identifier = node.get('name')
+        func = node.func
+        if func is not None:
+            return lambda: func
+
+        lookup = self.nonlocal_load(identifier, scope) if scope.slot(identifier) is None else partial(env.retrieve, identifier)
+
+        def callee():
+            func = lookup()
+            if type(func) is not FunctionObject:
+                if func is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'{identifier} is not defined')
+                error(ErrorType.TYPE_ERROR, f'{identifier} is not callable')
+            return func
+
+        return callee
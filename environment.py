@@ -3,7 +3,6 @@ from enum import Enum, auto
 from typing import Deque, Optional
 from element import Element
 from objects import *
-import uuid
 
 class ScopeRule(Enum):
     STATIC = auto()
@@ -15,12 +14,30 @@ class ENV_STATUS(Enum):
     REDEFINE = auto()
     FAILURE = auto()
 
+class CONTROL(Enum):
+    # Returned by a statement (and passed up by the blocks around it) to leave the
+    # function; every other statement returns None
+    RETURN = auto()
+    TAIL_CALL = auto()
+
 
 
 class Frame:
+    # captured is set once a function is defined in the frame; such frames are never recycled.
+    # discard is set on a frame that a discarding tail call moved into: its result is nil
+    __slots__ = ('var', 'lexical_parent', 'scope', 'captured', 'discard')
+
     def __init__(self, parent=None, lexical_parent=None):
         self.var: dict[str, object] = {}
         self.lexical_parent: Optional['Frame'] = lexical_parent
+        self.scope = None
+        self.captured = False
+        self.discard = False
+
+    def reset(self):
+        self.var.clear()
+        self.lexical_parent = None
+        self.discard = False
     
     def define_identifier(self, identifier, value) -> ENV_STATUS:
         if identifier in self.var.keys():
@@ -38,33 +55,134 @@ class Frame:
     def retrieve(self, identifier):
         return self.var.get(identifier, ENV_STATUS.IDENTIFIER_NOT_FOUND)
 
+class SlotFrame(Frame):
+    """Frame whose locals live in a fixed-size list, indexed by the slots of a resolver Scope.
+
+    Compiled code reads and writes self.slots directly; the by-name methods serve
+    dynamic lookups coming from other frames. An unbound slot holds IDENTIFIER_NOT_FOUND.
+    """
+    __slots__ = ('slots', 'unbound')
+
+    def __init__(self, scope, lexical_parent=None):
+        self.scope = scope
+        self.unbound = (ENV_STATUS.IDENTIFIER_NOT_FOUND,) * len(scope)
+        self.slots: list = list(self.unbound)
+        self.lexical_parent: Optional['Frame'] = lexical_parent
+        self.captured = False
+        self.discard = False
+
+    def reset(self):
+        self.slots[:] = self.unbound
+        self.lexical_parent = None
+        self.discard = False
+
+    def define_identifier(self, identifier, value) -> ENV_STATUS:
+        slot = self.scope.slot(identifier)
+        if self.slots[slot] is not ENV_STATUS.IDENTIFIER_NOT_FOUND:
+            return ENV_STATUS.REDEFINE
+        self.slots[slot] = value
+        return ENV_STATUS.SUCCESS
+
+    # A name declared in nested blocks has several slots, innermost first; the first
+    # bound one is the visible binding
+    def assign_identifier(self, identifier, value) -> ENV_STATUS:
+        for slot in self.scope.slots_of(identifier):
+            if self.slots[slot] is not ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                self.slots[slot] = value
+                return ENV_STATUS.SUCCESS
+        return ENV_STATUS.IDENTIFIER_NOT_FOUND
+
+    def retrieve(self, identifier):
+        for slot in self.scope.slots_of(identifier):
+            value = self.slots[slot]
+            if value is not ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                return value
+        return ENV_STATUS.IDENTIFIER_NOT_FOUND
+
 class Environment:
-    def __init__(self, scope_rule = ScopeRule.DYNAMIC):
+    # Interned small ints and strings for create_object; replace with
+    # InternTable(low, high) to change the preallocated int range
+    interned: InternTable = InternTable()
+
+    def __init__(self, scope_rule = ScopeRule.DYNAMIC, pool_limit=64):
         self.scope_rule: ScopeRule = scope_rule
         self.frames: Deque[Frame] = deque()
         self.global_frame: Frame = Frame()
         self.frames.append(self.global_frame)
 
+        # Popped frames are cleared and kept for reuse, keyed by slot layout (None for
+        # by-name frames); at most pool_limit frames are held across all layouts
+        self.pool: dict[object, list[Frame]] = {}
+        self.pool_limit = pool_limit
+        self.pooled = 0
+        self.frames_allocated = 0
+        self.frames_reused = 0
+
     @property
     def current_frame(self) -> Frame:
         return self.frames[-1]
 
-    def push_frame(self, static_link=None):
-        new_frame = Frame()
-        new_frame.static_link = static_link
+    def push_frame(self, lexical_parent=None, scope=None):
+        free = self.pool.get(scope)
+        if free:
+            new_frame = free.pop()
+            new_frame.lexical_parent = lexical_parent
+            self.pooled -= 1
+            self.frames_reused += 1
+        else:
+            new_frame = Frame(lexical_parent=lexical_parent) if scope is None else SlotFrame(scope, lexical_parent)
+            self.frames_allocated += 1
         self.frames.append(new_frame)
         return ENV_STATUS.SUCCESS
+
+    def release(self, frame: Frame):
+        """Returns a popped frame to the pool, unless a function captured it or the pool is full."""
+        if frame.captured or self.pooled >= self.pool_limit:
+            return
+        frame.reset()
+        self.pool.setdefault(frame.scope, []).append(frame)
+        self.pooled += 1
+
+    def pool_stats(self) -> dict:
+        return {
+            'frames_allocated': self.frames_allocated,
+            'frames_reused': self.frames_reused,
+            'frames_pooled': self.pooled,
+            'frame_pool_limit': self.pool_limit,
+        }
+
+    def push_block(self):
+        """Pushes the frame for an if or while body, whose vars vanish when it is popped."""
+        return self.push_frame(lexical_parent=self.frames[-1])
+
+    def frame_at(self, depth) -> Frame:
+        """The frame `depth` static links out from the current one."""
+        frame = self.frames[-1]
+        for _ in range(depth):
+            frame = frame.lexical_parent
+        return frame
+
+    def allocate_globals(self, scope):
+        """Gives the (still empty) global frame the slot layout of a resolver Scope, so
+        lexically addressed code can reach globals by slot."""
+        self.global_frame = SlotFrame(scope)
+        self.frames[0] = self.global_frame
+
+    def bind_arguments(self, params, args):
+        self.current_frame.var.update(zip(params, args))
     
     def pop_frame(self):
         if len(self.frames) >= 1:
-            self.frames.pop()
+            self.release(self.frames.pop())
             return ENV_STATUS.SUCCESS
         
         return ENV_STATUS.FAILURE
     
     def define_identifier(self, identifier: str, value: any = None, node: Element = None):
         obj_type = None
-        if isinstance(value, int):
+        if isinstance(value, bool):
+            obj_type = OBJECT_TYPES.BOOL
+        elif isinstance(value, int):
             obj_type = OBJECT_TYPES.INT
         elif isinstance(value, float):
             obj_type = OBJECT_TYPES.FLOAT
@@ -77,8 +195,10 @@ class Environment:
 
         
         obj = Environment.create_object(name=identifier, node=node, env=self, value=value, obj_type=obj_type)
-        STATUS = self.current_frame.define_identifier(identifier=identifier, value=obj)
-        return STATUS
+        return self.bind(identifier, obj)
+
+    def bind(self, identifier, obj) -> ENV_STATUS:
+        return self.current_frame.define_identifier(identifier=identifier, value=obj)
  
     def assign_identifier(self, identifier, value):
         if self.scope_rule == ScopeRule.DYNAMIC:
@@ -104,40 +224,84 @@ class Environment:
             frame = self.current_frame
             while frame:
                 value = frame.retrieve(identifier=identifier)
-                if value != None: return value
+                if value is not ENV_STATUS.IDENTIFIER_NOT_FOUND: return value
                 frame = frame.lexical_parent
 
         return ENV_STATUS.IDENTIFIER_NOT_FOUND
     
     @classmethod
     def create_object(cls, name: str, node: Element, env: "Environment", value: any = None, obj_type: Enum = OBJECT_TYPES.OBJECT):
-        if not name:
-            name = f"_lit_{uuid.uuid4().hex}"
-
-        obj = None
-        if obj_type == OBJECT_TYPES.INT:
-            obj = Int(name, value)
-        elif obj_type == OBJECT_TYPES.FLOAT:
-            obj = Float(name, value)
-        elif obj_type == OBJECT_TYPES.FUNCTION:
+        # Temporaries (literals, operation results, call arguments) are never looked up by
+        # name, so they stay anonymous and immutable ones are shared through the intern table
+        if obj_type is OBJECT_TYPES.INT:
+            return Int(name, value) if name else cls.interned.int(value)
+        elif obj_type is OBJECT_TYPES.STRING:
+            return String(name, value) if name else cls.interned.string(value)
+        elif obj_type is OBJECT_TYPES.BOOL:
+            return Bool(name, value) if name else cls.interned.bool(value)
+        elif obj_type is OBJECT_TYPES.FLOAT:
+            return Float(name or None, value)
+        elif obj_type is OBJECT_TYPES.FUNCTION:
+            env.current_frame.captured = True
             args = node.get('args')
             statements = node.get('statements')
-            obj = FunctionObject(
+            return FunctionObject(
                 name=name,
                 args=args,
                 statements=statements,
                 lexical_parent=env.current_frame
             )
-        elif obj_type == OBJECT_TYPES.STRING:
-            obj = String(name, value)
-        elif obj_type == OBJECT_TYPES.UNINITIALIZED:
-            obj = OBJECT_TYPES.UNINITIALIZED
+        elif obj_type is OBJECT_TYPES.UNINITIALIZED:
+            return OBJECT_TYPES.UNINITIALIZED
 
-        return obj
+        return None
 
 
+class ShallowEnvironment(Environment):
+    """Dynamic scoping with shallow binding.
 
-    
-    
+    A central table maps every identifier to the stack of its live bindings, innermost
+    last, so retrieve and assign_identifier cost the same at any call depth. Frames only
+    record which names they bound, so pop_frame knows which bindings to discard.
+    """
 
-        
+    def __init__(self, pool_limit=64):
+        self.bindings: dict[str, list] = {}
+        super().__init__(ScopeRule.DYNAMIC, pool_limit)
+
+    def bind(self, identifier, obj) -> ENV_STATUS:
+        frame = self.current_frame
+        if identifier in frame.var:
+            return ENV_STATUS.REDEFINE
+        frame.var[identifier] = None
+        self.bindings.setdefault(identifier, []).append(obj)
+        return ENV_STATUS.SUCCESS
+
+    def bind_arguments(self, params, args):
+        for identifier, value in zip(params, args):
+            self.bind(identifier, value)
+
+    def pop_frame(self):
+        if len(self.frames) >= 1:
+            bindings = self.bindings
+            frame = self.frames.pop()
+            for identifier in frame.var:
+                stack = bindings[identifier]
+                stack.pop()
+                if not stack:
+                    del bindings[identifier]
+            self.release(frame)
+            return ENV_STATUS.SUCCESS
+
+        return ENV_STATUS.FAILURE
+
+    def assign_identifier(self, identifier, value):
+        stack = self.bindings.get(identifier)
+        if not stack:
+            return ENV_STATUS.IDENTIFIER_NOT_FOUND
+        stack[-1] = value
+        return ENV_STATUS.SUCCESS
+
+    def retrieve(self, identifier):
+        stack = self.bindings.get(identifier)
+        return stack[-1] if stack else ENV_STATUS.IDENTIFIER_NOT_FOUND
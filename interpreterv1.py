@@ -4,17 +4,50 @@ from brewparse import parse_program
 from element import Element
 from environment import *
 from objects import *
-import uuid
-
-class RETURN:
-    def __init__(self, value):
-        self.value = value
+from closures import ClosureCompiler
+from bytecode import VirtualMachine
+from regvm import RegisterVM
+from threaded import ThreadedVM
+from iterative import IterativeEvaluator
+from quickening import QuickeningEvaluator
+from transpiler import PythonTranspiler
+from tiering import TieredEvaluator
+from tracing import LoopTracer
+from resolver import Resolver
+from optimizer import attach_constants, fold_constants, link_call_sites, mark_tail_calls
+
+def flag(value) -> bool:
+    """Reads a boolean option, which arrives as a string from the command line."""
+    if isinstance(value, str):
+        return value.lower() in ["true", "1", "yes"]
+    return bool(value)
 
 
 class Interpreter(InterpreterBase):
-    def __init__(self, console_output=True, inp=None, trace_output=False):
+    def __init__(self, console_output=True, inp=None, trace_output=False, backend="tree", fold_constants=False, binding="deep", scoping="dynamic", frame_pool=64, eval_budget=1_000_000, tail_calls=True, tier_threshold=10, trace_loops=0, peephole=False):
         super().__init__(console_output, inp)
-        self.env = Environment()
+        if scoping not in ["dynamic", "static"]:
+            raise ValueError(f"Unknown scoping {scoping}")
+        scope_rule = ScopeRule.STATIC if scoping == "static" else ScopeRule.DYNAMIC
+
+        # "deep" searches the frame stack on every lookup; "shallow" keeps one binding
+        # stack per identifier (not for the compiled backends, which address frame slots)
+        # frame_pool bounds how many popped frames are kept for reuse (0 disables it)
+        if binding == "deep":
+            self.env = Environment(scope_rule, int(frame_pool))
+        elif binding == "shallow" and backend in ["tree", "iterative", "quickening"] and scope_rule is ScopeRule.DYNAMIC:
+            self.env = ShallowEnvironment(int(frame_pool))
+        else:
+            raise ValueError(f"Unknown binding {binding} for {scoping} scoping on backend {backend}")
+        self.scopes = {}
+        self.functions: dict[str, FunctionObject] = {}
+        self.fold_constants = flag(fold_constants)
+        self.tail_calls = flag(tail_calls)
+        self.stats = {}
+
+        # Set by a statement that returns CONTROL.RETURN or CONTROL.TAIL_CALL
+        self.return_value = None
+        self.pending_call = None
 
         # Handle Builtin Functions
         self.builtin_dict = {
@@ -22,6 +55,48 @@ class Interpreter(InterpreterBase):
             'inputi': self.get_input
         }
 
+        # Execution backend for function bodies; "tree" walks the AST directly,
+        # "iterative" walks it on an explicit stack bounded by eval_budget and
+        # "quickening" walks it through node handlers that specialize themselves;
+        # "tiered" walks the tree until a function has had tier_threshold calls
+        if backend == "tree":
+            self.compiler = None
+        elif backend == "iterative":
+            self.compiler = IterativeEvaluator(self, eval_budget)
+        elif backend == "quickening":
+            self.compiler = QuickeningEvaluator(self)
+        elif backend == "closure":
+            self.compiler = ClosureCompiler(self)
+        elif backend == "bytecode":
+            self.compiler = VirtualMachine(self)
+        elif backend == "register":
+            self.compiler = RegisterVM(self)
+        elif backend == "threaded":
+            self.compiler = ThreadedVM(self)
+        elif backend == "python":
+            self.compiler = PythonTranspiler(self)
+        elif backend == "tiered":
+            self.compiler = TieredEvaluator(self, tier_threshold)
+        else:
+            raise ValueError(f"Unknown backend {backend}")
+        self.slot_frames = backend in ["closure", "bytecode", "register", "threaded", "python"]
+        self.tiered = backend == "tiered"
+
+        # trace_loops > 0 compiles a while loop that has run that many iterations into a
+        # trace, in the functions the tree walker runs
+        self.tracer = None
+        if int(trace_loops) > 0:
+            if backend not in ["tree", "tiered"]:
+                raise ValueError(f"Loop tracing is not available on backend {backend}")
+            self.tracer = LoopTracer(self, trace_loops)
+
+        # peephole fuses common bytecode sequences into superinstructions
+        self.peephole = flag(peephole)
+        if self.peephole:
+            if backend != "bytecode":
+                raise ValueError(f"The peephole pass is not available on backend {backend}")
+            self.stats['superinstructions'] = 0
+
 
 
     def run(self, program):
@@ -32,31 +107,125 @@ class Interpreter(InterpreterBase):
 
     
     def eval_program(self, node: Element):
+        self.load_program(node)
+        self.call_function(self.functions['main'], [])
+        self.stats.update(self.env.pool_stats())
+
+    def load_program(self, node: Element):
         function_defs = node.dict.get('functions', [])
         function_names = [f.get('name') for f in function_defs]
 
         if 'main' not in function_names:
             super().error(ErrorType.NAME_ERROR, "No main() function was found")
-        
 
+        if self.fold_constants:
+            self.stats['folded_nodes'] = fold_constants(node)
+        attach_constants(node)
+
+        # Compiled backends address locals by slot; resolve them before anything runs
+        if self.slot_frames:
+            resolver = Resolver(self)
+            self.scopes = resolver.resolve_program(node)
+            if self.env.scope_rule is ScopeRule.STATIC:
+                self.env.allocate_globals(resolver.globals)
+        elif self.tiered:
+            self.compiler.load_program(node)
+
+        # Every function is registered before main runs, in the function table as well
+        # as the global frame (where it is visible as a value)
         for def_node in function_defs:
             self.eval_function_def(def_node)
-    
+        self.stats['linked_call_sites'] = link_call_sites(node, self.functions)
+        self.stats['tail_calls'] = mark_tail_calls(node, self.functions, self.env.scope_rule is ScopeRule.STATIC, self.tail_calls)
+
     def eval_function_def(self, node: Element):
-        self.env.define_identifier(identifier=node.get('name'), node=node)
-        func_obj: FunctionObject = self.env.retrieve(node.get('name'))
+        identifier = node.get('name')
+        if self.env.define_identifier(identifier=identifier, node=node) == ENV_STATUS.REDEFINE:
+            return
 
-        if func_obj.get('name') == 'main':
-            self.fcall(func_obj)
+        func_obj: FunctionObject = self.env.retrieve(identifier)
+        func_obj.scope = self.scopes.get(node)
+        if len(set(func_obj.params)) != func_obj.arity:
+            super().error(ErrorType.NAME_ERROR, f'Duplicate parameter name in {identifier}()')
+        self.functions[identifier] = func_obj
 
     def eval_statement(self, node: Element):
+        """Runs a statement; returns a CONTROL status if it leaves the function, else None."""
         match node.elem_type:
             case self.VAR_DEF_NODE:
                 self.eval_vardef(node)
             case self.ASSIGNMENT_NODE:
                 self.eval_assign(node)
             case self.FCALL_NODE:
+                if node.tail:
+                    return self.tail_call(node)
                 self.fcall(node)
+            case self.IF_NODE:
+                return self.eval_if(node)
+            case self.WHILE_NODE:
+                return self.eval_while(node)
+            case self.RETURN_NODE:
+                return self.eval_return(node)
+        return None
+
+    def eval_block(self, statements):
+        for statement in statements:
+            status = self.eval_statement(statement)
+            if status is not None:
+                return status
+        return None
+
+    def eval_if(self, node: Element):
+        condition = self.eval_expr(node.get('condition'))
+        if type(condition) is not Bool:
+            super().error(ErrorType.TYPE_ERROR, 'Condition of if must be a bool')
+        if self.tracer is not None:
+            self.tracer.record(node, condition.value)
+
+        statements = node.get('statements') if condition.value else node.get('else_statements')
+        if not statements:
+            return None
+        self.env.push_block()
+        status = self.eval_block(statements)
+        self.env.pop_frame()
+        return status
+
+    def eval_while(self, node: Element):
+        condition, statements = node.get('condition'), node.get('statements')
+        tracer, iterations, status = self.tracer, 0, None
+        while True:
+            iterations += 1
+            if tracer is not None and tracer.enter(node, iterations):
+                break
+            value = self.eval_expr(condition)
+            if type(value) is not Bool:
+                super().error(ErrorType.TYPE_ERROR, 'Condition of while must be a bool')
+            if not value.value:
+                break
+            self.env.push_block()
+            status = self.eval_block(statements)
+            self.env.pop_frame()
+            if status is not None:
+                break
+        if tracer is not None:
+            tracer.leave(node)
+        return status
+
+    def eval_return(self, node: Element):
+        expression = node.get('expression')
+        if expression is None:
+            self.return_value = None
+        elif expression.elem_type == self.FCALL_NODE and expression.tail:
+            return self.tail_call(expression)
+        else:
+            self.return_value = self.eval_expr(expression)
+        return CONTROL.RETURN
+
+    def tail_call(self, node: Element):
+        # the call is made by call_function's loop, once the caller's frame is gone
+        func = self.callee(node)
+        self.pending_call = (func, [self.eval_expr(arg) for arg in node.get('args')], node.discard)
+        return CONTROL.TAIL_CALL
 
     def eval_vardef(self, node: Element) -> None:
         identifier = node.get('name')
@@ -86,7 +255,7 @@ class Interpreter(InterpreterBase):
             val1 = self.eval_expr(operand_1_node)
             val2 = self.eval_expr(operand_2_node)
 
-            if isinstance(val1, String) or isinstance(val2, String):
+            if not isinstance(val1, Int) or not isinstance(val2, Int):
                 super().error(ErrorType.TYPE_ERROR, '+ operation can only be applied to ints')
 
 
@@ -94,6 +263,8 @@ class Interpreter(InterpreterBase):
                 return Environment.create_object(name="", node=None, env=self.env, value=val1 + val2, obj_type=OBJECT_TYPES.INT)
             else: 
                 return Environment.create_object(name="", node=None, env=self.env, value=val1 - val2, obj_type=OBJECT_TYPES.INT)
+        elif element_type in COMPARISONS:
+            return self.compare(element_type, self.eval_expr(node.get('op1')), self.eval_expr(node.get('op2')))
         elif element_type == self.FCALL_NODE:
             return self.fcall(node)
         elif element_type == self.QUALIFIED_NAME_NODE:
@@ -112,62 +283,99 @@ class Interpreter(InterpreterBase):
             return value
         elif element_type == self.NEG_NODE:
             super().error(ErrorType.NAME_ERROR)
-        elif element_type == self.INT_NODE:
-            value = node.get('val')
-            return Environment.create_object(name="", node=None, env=self.env, value=value, obj_type=OBJECT_TYPES.INT)
-
-        elif element_type == self.STRING_NODE:
-            value = node.get('val')
-            return Environment.create_object(name="", node=None, env=self.env, value=value, obj_type=OBJECT_TYPES.STRING)
-
-    def fcall(self, node: FunctionObject):
+        elif element_type == self.INT_NODE or element_type == self.STRING_NODE or element_type == self.BOOL_NODE:
+            return node.const
+
+    def compare(self, operator, val1, val2) -> Bool:
+        # values of different types are never equal; only ints are ordered
+        if operator == '==' or operator == '!=':
+            # interning makes equal values usually the same object
+            if val1 is val2:
+                equal = True
+            elif type(val1) is not type(val2):
+                equal = False
+            elif isinstance(val1, (Int, String, Bool)):
+                equal = val1.value == val2.value
+            else:
+                equal = val1 is val2
+            return Environment.interned.bool(equal == (operator == '=='))
+
+        if not isinstance(val1, Int) or not isinstance(val2, Int):
+            super().error(ErrorType.TYPE_ERROR, f'{operator} operation can only be applied to ints')
+        return Environment.interned.bool(COMPARISONS[operator](val1.value, val2.value))
+
+    def fcall(self, node: Element):
         identifier = node.get('name')
 
-        if self.env.retrieve(identifier=identifier) == ENV_STATUS.IDENTIFIER_NOT_FOUND and identifier not in self.builtin_dict.keys():
-            self.error(ErrorType.NAME_ERROR, f'{identifier} is not defined')
-
-        if identifier not in self.builtin_dict.keys() and not isinstance(node, FunctionObject):
-            self.error(ErrorType.TYPE_ERROR, f'{identifier} is not callable')
-        return_val = None
-        args = [(arg.dict.get('name', f"_lit_{uuid.uuid4().hex}"), self.eval_expr(arg)) for arg in node.get('args')]
-
-        self.env.push_frame(static_link=self.env.current_frame)
+        if identifier in self.builtin_dict:
+            return self.call_builtin(identifier, [self.eval_expr(arg) for arg in node.get('args')])
 
-        for arg_name, arg_value in args:
-            if self.env.define_identifier(identifier=arg_name, value=arg_value, node=node) == ENV_STATUS.REDEFINE:
-                super().error(ErrorType.NAME_ERROR, f'Redefinition of {arg_name}')
+        func = self.callee(node)
+        return self.call_function(func, [self.eval_expr(arg) for arg in node.get('args')])
 
+    def callee(self, node: Element) -> FunctionObject:
+        func = node.func
+        if func is None:
+            identifier = node.get('name')
+            func = self.env.retrieve(identifier=identifier)
+            if func is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                self.error(ErrorType.NAME_ERROR, f'{identifier} is not defined')
+            if not isinstance(func, FunctionObject):
+                self.error(ErrorType.TYPE_ERROR, f'{identifier} is not callable')
+        return func
 
-        if identifier not in self.builtin_dict:
-            for statement in node.statements:
-                result = self.eval_statement(statement)
-
-                if isinstance(result, RETURN):
-                    return_val = result.value
-                    break
+    def call_function(self, func: FunctionObject, args: list):
+        self.enter_function(func, args)
 
-            self.env.pop_frame()
-            return return_val
+        return_val = None
+        if self.compiler is not None:
+            return_val = self.compiler.run(func)
         else:
-            if identifier == 'print':
-                return_string = ""
-
-                for name, value in args:
-                    return_string += str(value)
-
-                self.builtin_dict['print'](return_string)
-                self.env.pop_frame()
+            # A tail call replaces the current frame and runs in this loop
+            status = self.eval_block(func.statements)
+            while status is CONTROL.TAIL_CALL:
+                func = self.pending_call[0]
+                self.replace_frame(*self.pending_call)
+                status = self.eval_block(func.statements)
+            if status is CONTROL.RETURN:
+                return_val = self.return_value
+
+        if self.env.current_frame.discard:
+            return_val = None
+        self.env.pop_frame()
+        return return_val
+
+    def enter_function(self, func: FunctionObject, args: list):
+        if len(args) != func.arity:
+            self.error(ErrorType.NAME_ERROR, f'{func.name}() takes {func.arity} arguments but {len(args)} were given')
+        if self.tiered:
+            self.compiler.count(func)
+
+        # Arguments are bound positionally straight into the new frame, whose static link
+        # is the frame the function was defined in
+        self.env.push_frame(lexical_parent=func.lexical_parent, scope=func.scope)
+        if func.scope is None:
+            self.env.bind_arguments(func.params, args)
+        else:
+            self.env.current_frame.slots[:func.arity] = args
 
-            if identifier == 'inputi':
-                if len(args) > 1:
-                    super().error(ErrorType.NAME_ERROR, 'inputi() takes 0 or 1 arguments')
+    def replace_frame(self, func: FunctionObject, args: list, discard=False):
+        """Swaps the current frame for one running func, for a tail call. After a
+        discarding tail call the original call's result is nil, so the new frame is
+        marked to have its result dropped."""
+        discard = discard or self.env.current_frame.discard
+        self.env.pop_frame()
+        self.enter_function(func, args)
+        self.env.current_frame.discard = discard
 
-                return_string = ''
-                for name, value in args:
-                    return_string += str(value)
+    def call_builtin(self, identifier, args: list):
+        if identifier == 'print':
+            self.output("".join(str(value) for value in args))
+            return None
 
+        if len(args) > 1:
+            super().error(ErrorType.NAME_ERROR, 'inputi() takes 0 or 1 arguments')
 
-                if return_string != '': self.builtin_dict['print'](return_string)
-                result_obj = Environment.create_object(name="", node=None, env=self.env, value=int(self.builtin_dict['inputi']()), obj_type=OBJECT_TYPES.INT)
-                self.env.pop_frame()
-                return result_obj
\ No newline at end of file
+        prompt = "".join(str(value) for value in args)
+        if prompt != '': self.output(prompt)
+        return Environment.create_object(name="", node=None, env=self.env, value=int(self.get_input()), obj_type=OBJECT_TYPES.INT)
@@ -0,0 +1,223 @@
+"""
+Iterative evaluator for Brewin function bodies.
+
+Statements, expression operands and Brewin calls are pushed as work items onto a
+heap-allocated continuation stack instead of recursing on the Python stack, so
+expression nesting and call depth are bounded by the evaluator's budget rather than
+by sys.getrecursionlimit().
+"""
+
+from intbase import InterpreterBase, ErrorType
+from environment import Environment, ENV_STATUS, CONTROL
+from element import Element
+from objects import *
+
+# Work item kinds; each item is a (kind, payload) tuple
+EXEC = 0        # statement node
+EVAL = 1        # expression node; leaves its value on the value stack
+BINARY = 2      # +/- node; replaces the top two values with the result
+STORE = 3       # identifier; assigns the top value to it
+APPLY = 4       # (callee, argument count); the callee is a FunctionObject or a builtin name
+RETURN = 5      # pops the callee's frame and leaves its result
+DISCARD = 6     # drops the top value (the result of a call made as a statement)
+TAIL = 7        # like APPLY, but the callee replaces the current frame
+COMPARE = 8     # comparison node; replaces the top two values with a Bool
+BRANCH = 9      # if node; pops its condition and runs the chosen block
+BLOCK_END = 10  # pops the frame of an if or while body
+LEAVE = 11      # return; unwinds to the function's RETURN item with the top value
+LOOP = 12       # while node; pops its condition and runs the body once more, or stops
+
+
+class IterativeEvaluator:
+    """Runs function bodies on a continuation stack, with tree-walker semantics.
+
+    budget is the largest number of pending work items allowed; going past it is a
+    FAULT_ERROR instead of a Python RecursionError.
+    """
+
+    def __init__(self, interpreter, budget=1_000_000):
+        self.interpreter = interpreter
+        self.env = interpreter.env
+        self.budget = int(budget)
+
+    def run(self, func: FunctionObject):
+        interpreter, env, error = self.interpreter, self.env, self.interpreter.error
+        create_object = Environment.create_object
+        budget = self.budget
+
+        work = [(EXEC, statement) for statement in reversed(func.statements)]
+        values = []
+        push_work, pop_work = work.append, work.pop
+        push, pop = values.append, values.pop
+
+        while work:
+            kind, item = pop_work()
+
+            if kind == EVAL:
+                element_type = item.elem_type
+                if element_type in [InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE]:
+                    push(item.const)
+                elif element_type == InterpreterBase.QUALIFIED_NAME_NODE:
+                    push(self.lookup(item.get('name')))
+                elif element_type in ['+', '-'] or element_type in COMPARISONS:
+                    if len(work) >= budget:
+                        self.exhausted()
+                    push_work((BINARY if element_type in ['+', '-'] else COMPARE, item))
+                    push_work((EVAL, item.get('op2')))
+                    push_work((EVAL, item.get('op1')))
+                elif element_type == InterpreterBase.FCALL_NODE:
+                    args = item.get('args')
+                    if len(work) + len(args) >= budget:
+                        self.exhausted()
+                    push_work((APPLY, (self.callee(item), len(args))))
+                    for arg in reversed(args):
+                        push_work((EVAL, arg))
+                elif element_type == InterpreterBase.NEG_NODE:
+                    error(ErrorType.NAME_ERROR)
+                else:
+                    push(None)
+            elif kind == BINARY:
+                val2 = pop()
+                val1 = pop()
+                if not isinstance(val1, Int) or not isinstance(val2, Int):
+                    error(ErrorType.TYPE_ERROR, '+ operation can only be applied to ints')
+                value = val1 + val2 if item.elem_type == '+' else val1 - val2
+                push(create_object(name="", node=None, env=env, value=value, obj_type=OBJECT_TYPES.INT))
+            elif kind == COMPARE:
+                val2 = pop()
+                push(interpreter.compare(item.elem_type, pop(), val2))
+            elif kind == EXEC:
+                match item.elem_type:
+                    case InterpreterBase.VAR_DEF_NODE:
+                        interpreter.eval_vardef(item)
+                    case InterpreterBase.ASSIGNMENT_NODE:
+                        push_work((STORE, item.get('var')))
+                        push_work((EVAL, item.get('expression')))
+                    case InterpreterBase.FCALL_NODE if item.tail:
+                        self.push_tail_call(item, push_work)
+                    case InterpreterBase.FCALL_NODE:
+                        push_work((DISCARD, None))
+                        push_work((EVAL, item))
+                    case InterpreterBase.IF_NODE:
+                        push_work((BRANCH, item))
+                        push_work((EVAL, item.get('condition')))
+                    case InterpreterBase.WHILE_NODE:
+                        push_work((LOOP, item))
+                        push_work((EVAL, item.get('condition')))
+                    case InterpreterBase.RETURN_NODE:
+                        expression = item.get('expression')
+                        if expression is None:
+                            push(None)
+                            push_work((LEAVE, None))
+                        elif expression.elem_type == InterpreterBase.FCALL_NODE and expression.tail:
+                            self.push_tail_call(expression, push_work)
+                        else:
+                            push_work((LEAVE, None))
+                            push_work((EVAL, expression))
+            elif kind == BRANCH:
+                condition = pop()
+                if type(condition) is not Bool:
+                    error(ErrorType.TYPE_ERROR, 'Condition of if must be a bool')
+                statements = item.get('statements') if condition.value else item.get('else_statements')
+                if statements:
+                    if len(work) + len(statements) >= budget:
+                        self.exhausted()
+                    env.push_block()
+                    push_work((BLOCK_END, None))
+                    for statement in reversed(statements):
+                        push_work((EXEC, statement))
+            elif kind == LOOP:
+                condition = pop()
+                if type(condition) is not Bool:
+                    error(ErrorType.TYPE_ERROR, 'Condition of while must be a bool')
+                if condition.value:
+                    statements = item.get('statements')
+                    if len(work) + len(statements) + 2 >= budget:
+                        self.exhausted()
+                    env.push_block()
+                    push_work((LOOP, item))
+                    push_work((EVAL, item.get('condition')))
+                    push_work((BLOCK_END, None))
+                    for statement in reversed(statements):
+                        push_work((EXEC, statement))
+            elif kind == BLOCK_END:
+                env.pop_frame()
+            elif kind == LEAVE:
+                # drop the rest of the function, popping the frames of the blocks left;
+                # its RETURN item pops the function's frame, and if there is none the
+                # function is the one run was called for
+                value = pop()
+                while work:
+                    kind, _ = pop_work()
+                    if kind == BLOCK_END:
+                        env.pop_frame()
+                    elif kind == RETURN:
+                        if env.current_frame.discard:
+                            value = None
+                        env.pop_frame()
+                        push(value)
+                        break
+                else:
+                    return value
+            elif kind == STORE:
+                if env.assign_identifier(identifier=item, value=pop()) == ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'Variable {item} has not been defined')
+            elif kind == APPLY:
+                callee, argc = item
+                args = values[len(values) - argc:]
+                del values[len(values) - argc:]
+                if type(callee) is str:
+                    push(interpreter.call_builtin(callee, args))
+                    continue
+
+                if len(work) + len(callee.statements) >= budget:
+                    self.exhausted()
+                interpreter.enter_function(callee, args)
+                push_work((RETURN, None))
+                for statement in reversed(callee.statements):
+                    push_work((EXEC, statement))
+            elif kind == TAIL:
+                callee, argc, discard = item
+                args = values[len(values) - argc:]
+                del values[len(values) - argc:]
+                if len(work) + len(callee.statements) >= budget:
+                    self.exhausted()
+                while work and work[-1][0] != RETURN:
+                    if pop_work()[0] == BLOCK_END:
+                        env.pop_frame()
+                interpreter.replace_frame(callee, args, discard)
+                for statement in reversed(callee.statements):
+                    push_work((EXEC, statement))
+            elif kind == RETURN:
+                env.pop_frame()
+                push(None)
+            elif kind == DISCARD:
+                pop()
+
+        return None
+
+    def push_tail_call(self, node: Element, push_work):
+        # the pending RETURN (or the caller of run) pops the callee's frame
+        args = node.get('args')
+        push_work((TAIL, (self.callee(node), len(args), node.discard)))
+        for arg in reversed(args):
+            push_work((EVAL, arg))
+
+    def lookup(self, identifier):
+        value = self.env.retrieve(identifier=identifier)
+        if value is OBJECT_TYPES.UNINITIALIZED:
+            self.interpreter.error(ErrorType.NAME_ERROR, f'Variable {identifier} was defined but not initialized')
+        elif value is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+            self.interpreter.error(ErrorType.NAME_ERROR, f"Variable {identifier} has not been defined")
+        return value
+
+    def callee(self, node: Element):
+        """The FunctionObject (or builtin name) an fcall reaches, resolved before its
+        arguments are evaluated, as the tree walker does."""
+        identifier = node.get('name')
+        if identifier in self.interpreter.builtin_dict:
+            return identifier
+        return self.interpreter.callee(node)
+
+    def exhausted(self):
+        self.interpreter.error(ErrorType.FAULT_ERROR, f'Evaluation budget of {self.budget} pending work items exceeded')
@@ -1,3 +1,4 @@
+import operator
 from abc import ABC, abstractmethod
 from enum import Enum, auto
 
@@ -6,13 +7,26 @@ class OBJECT_TYPES(Enum):
     FLOAT = auto()
     FUNCTION = auto()
     STRING = auto()
+    BOOL = auto()
     OBJECT = auto()
     UNINITIALIZED = auto()
 
+# Comparison operators on raw Python values; Int operands are compared by value
+COMPARISONS = {
+    '==': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le,
+    '>': operator.gt, '>=': operator.ge,
+}
+
 class ObjectInterface(ABC):
-    def __init__(self, type):
-        self.type = type
-        self.lexical_parent = None
+    # Values are allocated for every literal and intermediate result, so they carry no
+    # per-instance __dict__; temporaries are created with name None
+    __slots__ = ('name',)
+
+    def get(self, key):
+        if key == 'name':
+            return self.name
+        return None
 
     @abstractmethod
     def __str__(self):
@@ -20,26 +34,35 @@ class ObjectInterface(ABC):
         pass
     
 class FunctionObject(ObjectInterface):
+    __slots__ = ('args', 'params', 'arity', 'statements', 'lexical_parent', 'scope', 'compiled')
+
     def __init__(self, name, args, statements, lexical_parent):
-        self.dict = {}
+        self.name = name
+        self.args = args
+        # Precomputed once so a call only has to check a length and bind positionally
+        self.params = tuple(arg.get('name') for arg in args)
+        self.arity = len(self.params)
         self.statements = statements
         self.lexical_parent = lexical_parent
-        self.dict['name'] = name
-        self.dict['args'] = args
+        self.scope = None
+        self.compiled = None
 
     def get(self, key):
-        if key not in self.dict:
-            return None
-        return self.dict[key]
+        if key == 'name':
+            return self.name
+        if key == 'args':
+            return self.args
+        return None
 
     def __str__(self):
         return f"<function {self.name} at {hex(id(self))}>"
 
 class Int(ObjectInterface):
+    __slots__ = ('value',)
+
     def __init__(self, name: str, value: int):
+        self.name = name
         self.value = value
-        self.dict = {}
-        self.dict['name'] = name
 
     def __add__(self, obj2: "Int"):
         return self.value + obj2.value
@@ -52,22 +75,68 @@ class Int(ObjectInterface):
         return str(self.value)
 
 class Float(ObjectInterface):
+    __slots__ = ('value',)
+
     def __init__(self, name: str, value: float):
+        self.name = name
         self.value = value
-        self.dict = {}
-        self.dict['name'] = name
 
     def __add__(self, obj2: "Float"):
-        return Float(self.value + obj2.value)
+        return Float(None, self.value + obj2.value)
 
     def __str__(self):
         return str(self.value)
 
 class String(ObjectInterface):
+    __slots__ = ('value',)
+
     def __init__(self, name: str, value: str):
+        self.name = name
         self.value = value
-        self.dict = {}
-        self.dict['name'] = name
 
     def __str__(self):
         return self.value
+
+class Bool(ObjectInterface):
+    __slots__ = ('value',)
+
+    def __init__(self, name: str, value: bool):
+        self.name = name
+        self.value = value
+
+    def __str__(self):
+        return "true" if self.value else "false"
+
+class InternTable:
+    """Shared immutable values handed out by Environment.create_object for temporaries.
+
+    Ints in [low, high] come from a preallocated table (like CPython's -5..256 cache,
+    but with a configurable range), equal string literals share one String and there
+    is one Bool per truth value, so hot loops stop allocating and equal values are
+    usually the same object. The table outlives a program, so it stops interning
+    strings once it holds max_strings of them.
+    """
+    def __init__(self, low: int = -5, high: int = 256, max_strings: int = 4096):
+        self.low = low
+        self.high = high
+        self.ints = [Int(None, value) for value in range(low, high + 1)]
+        self.strings: dict[str, String] = {}
+        self.max_strings = max_strings
+        self.true = Bool(None, True)
+        self.false = Bool(None, False)
+
+    def int(self, value: int) -> Int:
+        if self.low <= value <= self.high:
+            return self.ints[value - self.low]
+        return Int(None, value)
+
+    def string(self, value: str) -> String:
+        obj = self.strings.get(value)
+        if obj is None:
+            obj = String(None, value)
+            if len(self.strings) < self.max_strings:
+                self.strings[value] = obj
+        return obj
+
+    def bool(self, value: bool) -> Bool:
+        return self.true if value else self.false
@@ -0,0 +1,247 @@
+from intbase import InterpreterBase
+from environment import Environment
+from element import Element
+from objects import *
+
+
+def walk(node: Element):
+    """Yields every Element reachable from node, without recursing on the Python stack."""
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        yield node
+        for value in node.dict.values():
+            if isinstance(value, Element):
+                pending.append(value)
+            elif isinstance(value, list):
+                pending.extend(item for item in value if isinstance(item, Element))
+
+
+def attach_constants(program_node: Element):
+    """Attaches the runtime value of every literal node as node.const, so evaluating a
+    literal is an attribute fetch instead of a fresh allocation."""
+    for node in walk(program_node):
+        if node.elem_type == InterpreterBase.INT_NODE:
+            node.const = Environment.create_object(name="", node=None, env=None, value=node.get('val'), obj_type=OBJECT_TYPES.INT)
+        elif node.elem_type == InterpreterBase.STRING_NODE:
+            node.const = Environment.create_object(name="", node=None, env=None, value=node.get('val'), obj_type=OBJECT_TYPES.STRING)
+        elif node.elem_type == InterpreterBase.BOOL_NODE:
+            node.const = Environment.create_object(name="", node=None, env=None, value=node.get('val'), obj_type=OBJECT_TYPES.BOOL)
+
+
+LITERALS = [InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE, InterpreterBase.NIL_NODE]
+
+
+def fold_constants(program_node: Element) -> int:
+    """Folds +/- and comparison subtrees whose operands are all literals into a single
+    literal.
+
+    +, - and the ordering comparisons fold on int literals only, and == and != on
+    literals of any type (values of different types are never equal). Operations on
+    other operands are left alone so they still raise TYPE_ERROR at runtime. Folded
+    nodes are rewritten in place; returns the number of nodes removed.
+    """
+    removed = 0
+    # walk() is pre-order, so reversing it visits every operand before its operator
+    for node in reversed(list(walk(program_node))):
+        if node.elem_type not in ['+', '-'] and node.elem_type not in COMPARISONS:
+            continue
+        op1, op2 = node.get('op1'), node.get('op2')
+        if node.elem_type in ['==', '!=']:
+            if op1.elem_type not in LITERALS or op2.elem_type not in LITERALS:
+                continue
+            equal = op1.elem_type == op2.elem_type and op1.get('val') == op2.get('val')
+            node.dict = {'val': equal == (node.elem_type == '==')}
+            node.elem_type = InterpreterBase.BOOL_NODE
+            removed += 2
+            continue
+        if op1.elem_type != InterpreterBase.INT_NODE or op2.elem_type != InterpreterBase.INT_NODE:
+            continue
+
+        if node.elem_type in COMPARISONS:
+            node.dict = {'val': COMPARISONS[node.elem_type](op1.get('val'), op2.get('val'))}
+            node.elem_type = InterpreterBase.BOOL_NODE
+        else:
+            value = op1.get('val') + op2.get('val') if node.elem_type == '+' else op1.get('val') - op2.get('val')
+            node.elem_type = InterpreterBase.INT_NODE
+            node.dict = {'val': value}
+        removed += 2
+    return removed
+
+
+def link_call_sites(program_node: Element, functions: dict) -> int:
+    """Caches the FunctionObject each fcall will reach as node.func.
+
+    A name that any var, parameter or assignment in the program binds could shadow the
+    function under dynamic scoping, so those call sites get None and keep looking the
+    callee up at runtime. Returns the number of call sites linked.
+    """
+    nodes = list(walk(program_node))
+    bound = set()
+    for node in nodes:
+        if node.elem_type in [InterpreterBase.VAR_DEF_NODE, InterpreterBase.ARG_NODE]:
+            bound.add(node.get('name'))
+        elif node.elem_type == InterpreterBase.ASSIGNMENT_NODE:
+            bound.add(node.get('var'))
+
+    linked = 0
+    for node in nodes:
+        if node.elem_type == InterpreterBase.FCALL_NODE:
+            identifier = node.get('name')
+            node.func = None if identifier in bound else functions.get(identifier)
+            linked += node.func is not None
+    return linked
+
+
+def mark_tail_calls(program_node: Element, functions: dict, static=False, enabled=True) -> int:
+    """Sets node.tail on every fcall: True when the call is in tail position (see
+    tail_positions) and may replace the caller's frame instead of pushing a new one.
+    node.discard is True for a tail call made as a statement, whose value the caller
+    drops: the caller still returns nil, whatever the callee returns.
+
+    Under static scoping that is always safe. Under dynamic scoping the callee, and
+    everything it can call, must not look up any name the caller binds, since removing
+    the caller's frame would change what the lookup finds; a call whose target is only
+    known at runtime makes every call that can reach it unsafe. Returns the number marked.
+    """
+    for node in walk(program_node):
+        if node.elem_type == InterpreterBase.FCALL_NODE:
+            node.tail = node.discard = False
+    if not enabled:
+        return 0
+
+    if not static:
+        summaries = {name: summarize_function(func) for name, func in functions.items()}
+        reachable = reachable_free_names(summaries)
+    marked = 0
+    for name, func in functions.items():
+        for node, discard in tail_positions(func):
+            if node.get('name') in ['print', 'inputi']:
+                continue
+            if not static:
+                free = None if node.func is None else reachable[node.func.name]
+                if free is None or free & summaries[name][0]:
+                    continue
+            node.tail, node.discard = True, discard
+            marked += 1
+    return marked
+
+
+def tail_positions(func: FunctionObject):
+    """Yields (fcall, discard) for each call whose frame nothing needs once it is made:
+    the expression of any return, and a call statement that ends the function, or ends
+    a branch of an if that does (discard is True for those)."""
+    for statement in func.statements:
+        for node in walk(statement):
+            if node.elem_type == InterpreterBase.RETURN_NODE:
+                expression = node.get('expression')
+                if expression is not None and expression.elem_type == InterpreterBase.FCALL_NODE:
+                    yield expression, False
+
+    pending = [func.statements]
+    while pending:
+        statements = pending.pop()
+        if not statements:
+            continue
+        last = statements[-1]
+        if last.elem_type == InterpreterBase.FCALL_NODE:
+            yield last, True
+        elif last.elem_type == InterpreterBase.IF_NODE:
+            pending.append(last.get('statements'))
+            pending.append(last.get('else_statements'))
+
+
+def summarize_function(func: FunctionObject):
+    """(names bound in its frame or blocks, names it looks up outside them, names of the
+    functions it calls, whether it makes calls resolved only at runtime)."""
+    local, free, callees = set(func.params), set(), set()
+    dynamic_calls = False
+
+    # each pending block carries the names declared around it so far
+    pending = [(func.statements, set(func.params))]
+    while pending:
+        statements, defined = pending.pop()
+        for statement in statements:
+            expressions = [statement]
+            if statement.elem_type == InterpreterBase.VAR_DEF_NODE:
+                local.add(statement.get('name'))
+                defined.add(statement.get('name'))
+                continue
+            if statement.elem_type == InterpreterBase.ASSIGNMENT_NODE and statement.get('var') not in defined:
+                free.add(statement.get('var'))
+            elif statement.elem_type in [InterpreterBase.IF_NODE, InterpreterBase.WHILE_NODE]:
+                expressions = [statement.get('condition')]
+                pending.append((statement.get('statements'), set(defined)))
+                if statement.get('else_statements') is not None:
+                    pending.append((statement.get('else_statements'), set(defined)))
+            for node in (node for expression in expressions for node in walk(expression)):
+                if node.elem_type == InterpreterBase.QUALIFIED_NAME_NODE and node.get('name') not in defined:
+                    free.add(node.get('name'))
+                elif node.elem_type == InterpreterBase.FCALL_NODE and node.get('name') not in ['print', 'inputi']:
+                    if node.func is None:
+                        dynamic_calls = True
+                    else:
+                        callees.add(node.func.name)
+    return local, free, callees, dynamic_calls
+
+
+def reachable_free_names(summaries) -> dict:
+    """Maps each function name to the free names of that function and every function it
+    can reach, or to None if one of them makes a call resolved only at runtime.
+
+    Functions that can reach each other (a strongly connected component of the call
+    graph) share one result, so each component is computed once, callees first, with
+    an iterative Tarjan walk.
+    """
+    index, low = {}, {}
+    stack, on_stack = [], set()
+    result = {}
+
+    def visit(name):
+        index[name] = low[name] = len(index)
+        stack.append(name)
+        on_stack.add(name)
+        return name, iter(summaries[name][2])
+
+    for root in summaries:
+        if root in index:
+            continue
+        work = [visit(root)]
+        while work:
+            name, callees = work[-1]
+            for callee in callees:
+                if callee not in index:
+                    work.append(visit(callee))
+                    break
+                if callee in on_stack:
+                    low[name] = min(low[name], index[callee])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[name])
+                if low[name] == index[name]:
+                    component = set()
+                    while name not in component:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.add(member)
+                    free = component_free_names(component, summaries, result)
+                    for member in component:
+                        result[member] = free
+    return result
+
+
+def component_free_names(component, summaries, result):
+    # callees outside the component belong to components that are already finished
+    free = set()
+    for member in component:
+        _, names, callees, dynamic_calls = summaries[member]
+        if dynamic_calls:
+            return None
+        free |= names
+        for callee in callees - component:
+            if result[callee] is None:
+                return None
+            free |= result[callee]
+    return free
@@ -0,0 +1,176 @@
+"""
+Peephole pass over bytecode, and the opcode-pair profile that chooses its superinstructions.
+
+optimize() replaces common instruction sequences with one superinstruction each, so
+the VM dispatches once where it dispatched two to four times. The sequences come
+from profiling: `python peephole.py [program.br ...]` runs a corpus (by default the
+v1 tests that read no input) on the stack VM, and lists the most frequently executed
+opcode pairs. Each pair is one dispatch that fusing it would save. The report then
+reruns the corpus with the pass enabled and counts the dispatches saved.
+"""
+
+import collections
+import glob
+import os
+import sys
+
+from bytecode import *
+
+
+def fuse_inc(code_object, instructions):
+    (_, slot), (_, const), (op, _), (_, store) = instructions
+    value = code_object.consts[const]
+    if slot != store or type(value) is not Int:
+        return None
+    # the operator is kept for the slow path's error message
+    if op == BINARY_ADD:
+        return INC_FAST, (slot, value.value, '+')
+    return INC_FAST, (slot, -value.value, '-')
+
+
+def fuse_print(code_object, instructions):
+    (_, const), (_, count), _ = instructions
+    return (PRINT_CONST, (const,)) if count == 1 else None
+
+
+def fuse_args(superinstruction):
+    """Builder of a superinstruction whose argument is every argument of the sequence."""
+    return lambda code_object, instructions: (superinstruction, tuple(arg for _, arg in instructions))
+
+
+def fuse_store(code_object, instructions):
+    _, (_, slot) = instructions
+    return ADD_STORE_FAST, (slot,)
+
+
+# (opcodes of the sequence, builder of its superinstruction from the (op, arg) pairs,
+# or None if these instructions cannot be fused); longer sequences are tried first
+SUPERINSTRUCTIONS = [
+    ((LOAD_FAST, LOAD_CONST, BINARY_ADD, STORE_FAST), fuse_inc),
+    ((LOAD_FAST, LOAD_CONST, BINARY_SUB, STORE_FAST), fuse_inc),
+    ((LOAD_CONST, CALL_PRINT, POP_TOP), fuse_print),
+    ((COMPARE_OP, POP_JUMP_IF_FALSE), fuse_args(COMPARE_JUMP)),
+    ((LOAD_FAST, LOAD_FAST), fuse_args(LOAD_FAST_LOAD_FAST)),
+    ((LOAD_FAST, LOAD_CONST), fuse_args(LOAD_FAST_LOAD_CONST)),
+    ((BINARY_ADD, STORE_FAST), fuse_store),
+]
+
+BY_FIRST_OPCODE = collections.defaultdict(list)
+for sequence in SUPERINSTRUCTIONS:
+    BY_FIRST_OPCODE[sequence[0][0]].append(sequence)
+
+
+def optimize(code_object: CodeObject) -> int:
+    """Rewrites code_object.code in place; returns the number of instructions removed.
+
+    A sequence is only fused if no jump lands inside it, and jump targets are remapped
+    to the shortened code afterwards.
+    """
+    code = code_object.code
+    instructions = [(code[pc], code[pc + 1]) for pc in range(0, len(code), 2)]
+    targets = {arg // 2 for op, arg in instructions if op in HAS_JUMP}
+
+    opcodes = tuple(code[::2])
+
+    fused, index_map, i = [], {}, 0
+    while i < len(instructions):
+        index_map[i] = len(fused)
+        for ops, build in BY_FIRST_OPCODE.get(opcodes[i], ()):
+            if opcodes[i:i + len(ops)] != ops or not targets.isdisjoint(range(i + 1, i + len(ops))):
+                continue
+            superinstruction = build(code_object, instructions[i:i + len(ops)])
+            if superinstruction is not None:
+                fused.append(superinstruction)
+                i += len(ops)
+                break
+        else:
+            fused.append(instructions[i])
+            i += 1
+    index_map[len(instructions)] = len(fused)
+
+    code_object.code = []
+    for op, arg in fused:
+        if op in HAS_JUMP:
+            arg = index_map[arg // 2] * 2
+        elif op == COMPARE_JUMP:
+            arg = (arg[0], index_map[arg[1] // 2] * 2)
+        code_object.code += [op, arg]
+    return len(instructions) - len(fused)
+
+
+class ProfiledCode(list):
+    """A code list that counts (opcode, next opcode) pairs in pairs as the VM fetches
+    its opcodes (the even indexes), so the dispatch loop itself does no profiling."""
+
+    def __init__(self, code, pairs: collections.Counter):
+        super().__init__(code)
+        self.pairs = pairs
+
+    def __getitem__(self, index):
+        value = list.__getitem__(self, index)
+        if index % 2 == 0:
+            self.pairs[self.pairs.previous, value] += 1
+            self.pairs.previous = value
+        return value
+
+
+class ProfilingVM(VirtualMachine):
+    """A VirtualMachine whose code objects are ProfiledCode, all counting into pairs."""
+
+    def __init__(self, interpreter, pairs: collections.Counter):
+        super().__init__(interpreter)
+        self.pairs = pairs
+
+    def compile(self, func: FunctionObject) -> CodeObject:
+        code_object = super().compile(func)
+        if type(code_object.code) is not ProfiledCode:
+            code_object.code = ProfiledCode(code_object.code, self.pairs)
+        return code_object
+
+
+def profile_corpus(sources, peephole_enabled=False) -> collections.Counter:
+    """Executed (opcode, next opcode) pairs over every program in sources."""
+    from brewparse import parse_program
+    from interpreterv1 import Interpreter
+
+    profile = collections.Counter()
+    for source in sources:
+        # the opcode executed before a program's first is None
+        profile.previous = None
+        interpreter = Interpreter(False, None, False, backend="bytecode", peephole=peephole_enabled)
+        interpreter.compiler = ProfilingVM(interpreter, profile)
+        interpreter.eval_program(parse_program(source))
+    return profile
+
+
+def main():
+    paths = sys.argv[1:] or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), "v1", "tests", "*.br")))
+    sources = []
+    for path in paths:
+        with open(path, encoding="utf-8") as handle:
+            sources.append(handle.read())
+    if not sys.argv[1:]:
+        sources = [source for source in sources if "inputi" not in source]
+
+    pairs = profile_corpus(sources)
+    total = sum(pairs.values())
+    fusible = {ops[:2] for ops, _ in SUPERINSTRUCTIONS}
+    print(f"{total} dispatches; opcode pairs by execution count (each saves one dispatch if fused):")
+    for (first, second), count in pairs.most_common(20):
+        if first is None:
+            continue
+        mark = "  (fused)" if (first, second) in fusible else ""
+        print(f"  {OPNAMES[first]:<20} {OPNAMES[second]:<20} {count:>8} {count / total:6.1%}{mark}")
+
+    optimized = profile_corpus(sources, peephole_enabled=True)
+    executed = collections.Counter()
+    for (_, op), count in optimized.items():
+        executed[op] += count
+    optimized_total = sum(optimized.values())
+    print(f"\nWith superinstructions: {optimized_total} dispatches ({1 - optimized_total / total:.1%} fewer)")
+    for op in range(INC_FAST, len(OPNAMES)):
+        print(f"  {OPNAMES[op]:<22} executed {executed[op]:>8} times")
+
+
+if __name__ == "__main__":
+    main()
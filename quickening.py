@@ -0,0 +1,265 @@
+"""
+Self-specializing ("quickening") tree walker for Brewin function bodies.
+
+Every AST node carries its own handler and is evaluated as node.handler(node). A node
+starts out with a first-run handler that evaluates it generically and then rewrites
+node.handler for what it saw: an operator that found two Ints switches to an int-only
+handler behind a type guard. When a guard fails the node deoptimizes to the generic
+handler for good, so a node that sees mixed types stops rewriting itself.
+"""
+
+from intbase import InterpreterBase, ErrorType
+from environment import Environment, ENV_STATUS, CONTROL
+from element import Element
+from objects import *
+from optimizer import walk
+
+
+class QuickeningEvaluator:
+    """Runs function bodies by calling node handlers, with tree-walker semantics.
+
+    Counts the nodes that specialized and deoptimized in interpreter.stats
+    ('specialized_nodes' and 'deoptimized_nodes').
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.env = interpreter.env
+        self.stats = interpreter.stats
+        self.stats['specialized_nodes'] = 0
+        self.stats['deoptimized_nodes'] = 0
+
+        self.handlers = {
+            '+': self.first_arith,
+            '-': self.first_arith,
+            InterpreterBase.INT_NODE: self.literal,
+            InterpreterBase.STRING_NODE: self.literal,
+            InterpreterBase.BOOL_NODE: self.literal,
+            InterpreterBase.QUALIFIED_NAME_NODE: self.load,
+            InterpreterBase.FCALL_NODE: self.eval_call,
+            InterpreterBase.NEG_NODE: self.neg,
+            InterpreterBase.VAR_DEF_NODE: self.vardef,
+            InterpreterBase.ASSIGNMENT_NODE: self.assign,
+            InterpreterBase.IF_NODE: self.if_,
+            InterpreterBase.WHILE_NODE: self.while_,
+            InterpreterBase.RETURN_NODE: self.return_,
+        }
+        for operator in COMPARISONS:
+            self.handlers[operator] = self.first_compare
+
+    def run(self, func: FunctionObject):
+        interpreter = self.interpreter
+        status = self.block(self.prepare(func))
+        while status is CONTROL.TAIL_CALL:
+            func = interpreter.pending_call[0]
+            interpreter.replace_frame(*interpreter.pending_call)
+            status = self.block(self.prepare(func))
+        return interpreter.return_value if status is CONTROL.RETURN else None
+
+    def prepare(self, func: FunctionObject):
+        """Installs the first-run handlers on func's nodes, the first time it runs, and
+        caches the children each handler needs as attributes."""
+        if func.compiled is not None:
+            return func.statements
+
+        for statement in func.statements:
+            for node in walk(statement):
+                node.handler = self.handlers.get(node.elem_type, self.nil)
+                if node.elem_type in ['+', '-'] or node.elem_type in COMPARISONS:
+                    node.op1, node.op2 = node.get('op1'), node.get('op2')
+                    node.compare = COMPARISONS.get(node.elem_type)
+                elif node.elem_type == InterpreterBase.FCALL_NODE:
+                    node.call = self.first_call
+                    node.arguments = node.get('args')
+
+        # a call made as a statement discards its value, or is a tail call
+        pending = [func.statements]
+        while pending:
+            for statement in pending.pop():
+                if statement.elem_type == InterpreterBase.FCALL_NODE:
+                    statement.handler = self.tail_call if statement.tail else self.exec_call
+                elif statement.elem_type in [InterpreterBase.IF_NODE, InterpreterBase.WHILE_NODE]:
+                    pending.append(statement.get('statements'))
+                    if statement.get('else_statements'):
+                        pending.append(statement.get('else_statements'))
+
+        func.compiled = True
+        return func.statements
+
+    def specialize(self, node: Element, handler):
+        node.handler = handler
+        self.stats['specialized_nodes'] += 1
+
+    def deoptimize(self, node: Element, handler):
+        node.handler = handler
+        self.stats['deoptimized_nodes'] += 1
+
+    # Statements: each returns a CONTROL status if it leaves the function, else None
+
+    def block(self, statements):
+        for statement in statements:
+            status = statement.handler(statement)
+            if status is not None:
+                return status
+        return None
+
+    def nested_block(self, statements):
+        self.env.push_block()
+        status = self.block(statements)
+        self.env.pop_frame()
+        return status
+
+    def vardef(self, node: Element):
+        self.interpreter.eval_vardef(node)
+
+    def assign(self, node: Element):
+        expression = node.get('expression')
+        value = expression.handler(expression)
+        if self.env.assign_identifier(identifier=node.get('var'), value=value) == ENV_STATUS.IDENTIFIER_NOT_FOUND:
+            self.interpreter.error(ErrorType.NAME_ERROR, f"Variable {node.get('var')} has not been defined")
+
+    def condition(self, node: Element, statement):
+        condition = node.get('condition')
+        value = condition.handler(condition)
+        if type(value) is not Bool:
+            self.interpreter.error(ErrorType.TYPE_ERROR, f'Condition of {statement} must be a bool')
+        return value.value
+
+    def if_(self, node: Element):
+        statements = node.get('statements') if self.condition(node, 'if') else node.get('else_statements')
+        if statements:
+            return self.nested_block(statements)
+
+    def while_(self, node: Element):
+        statements = node.get('statements')
+        while self.condition(node, 'while'):
+            status = self.nested_block(statements)
+            if status is not None:
+                return status
+
+    def return_(self, node: Element):
+        expression = node.get('expression')
+        if expression is None:
+            self.interpreter.return_value = None
+        elif expression.elem_type == InterpreterBase.FCALL_NODE and expression.tail:
+            return self.tail_call(expression)
+        else:
+            self.interpreter.return_value = expression.handler(expression)
+        return CONTROL.RETURN
+
+    def exec_call(self, node: Element):
+        node.call(node)
+
+    def tail_call(self, node: Element):
+        # the call is made by run's loop, once the caller's frame is gone
+        func = self.interpreter.callee(node)
+        self.interpreter.pending_call = (func, [arg.handler(arg) for arg in node.arguments], node.discard)
+        return CONTROL.TAIL_CALL
+
+    # Expressions
+
+    def literal(self, node: Element):
+        return node.const
+
+    def nil(self, node: Element):
+        return None
+
+    def neg(self, node: Element):
+        self.interpreter.error(ErrorType.NAME_ERROR)
+
+    def load(self, node: Element):
+        identifier = node.get('name')
+        value = self.env.retrieve(identifier=identifier)
+        if value is OBJECT_TYPES.UNINITIALIZED:
+            self.interpreter.error(ErrorType.NAME_ERROR, f'Variable {identifier} was defined but not initialized')
+        elif value is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+            self.interpreter.error(ErrorType.NAME_ERROR, f"Variable {identifier} has not been defined")
+        return value
+
+    def first_arith(self, node: Element):
+        op1, op2 = node.op1, node.op2
+        val1, val2 = op1.handler(op1), op2.handler(op2)
+        if type(val1) is Int and type(val2) is Int:
+            self.specialize(node, self.int_add if node.elem_type == '+' else self.int_sub)
+        else:
+            node.handler = self.arith
+        return self.apply_arith(node, val1, val2)
+
+    def arith(self, node: Element):
+        op1, op2 = node.op1, node.op2
+        return self.apply_arith(node, op1.handler(op1), op2.handler(op2))
+
+    def apply_arith(self, node: Element, val1, val2):
+        if not isinstance(val1, Int) or not isinstance(val2, Int):
+            self.interpreter.error(ErrorType.TYPE_ERROR, '+ operation can only be applied to ints')
+        value = val1 + val2 if node.elem_type == '+' else val1 - val2
+        return Environment.create_object(name="", node=None, env=self.env, value=value, obj_type=OBJECT_TYPES.INT)
+
+    def int_add(self, node: Element):
+        op1, op2 = node.op1, node.op2
+        val1, val2 = op1.handler(op1), op2.handler(op2)
+        if type(val1) is Int and type(val2) is Int:
+            return Environment.interned.int(val1.value + val2.value)
+        self.deoptimize(node, self.arith)
+        return self.apply_arith(node, val1, val2)
+
+    def int_sub(self, node: Element):
+        op1, op2 = node.op1, node.op2
+        val1, val2 = op1.handler(op1), op2.handler(op2)
+        if type(val1) is Int and type(val2) is Int:
+            return Environment.interned.int(val1.value - val2.value)
+        self.deoptimize(node, self.arith)
+        return self.apply_arith(node, val1, val2)
+
+    def first_compare(self, node: Element):
+        op1, op2 = node.op1, node.op2
+        val1, val2 = op1.handler(op1), op2.handler(op2)
+        if type(val1) is Int and type(val2) is Int:
+            self.specialize(node, self.int_compare)
+        else:
+            node.handler = self.compare
+        return self.interpreter.compare(node.elem_type, val1, val2)
+
+    def compare(self, node: Element):
+        op1, op2 = node.op1, node.op2
+        return self.interpreter.compare(node.elem_type, op1.handler(op1), op2.handler(op2))
+
+    def int_compare(self, node: Element):
+        op1, op2 = node.op1, node.op2
+        val1, val2 = op1.handler(op1), op2.handler(op2)
+        if type(val1) is Int and type(val2) is Int:
+            return Environment.interned.bool(node.compare(val1.value, val2.value))
+        self.deoptimize(node, self.compare)
+        return self.interpreter.compare(node.elem_type, val1, val2)
+
+    def eval_call(self, node: Element):
+        return node.call(node)
+
+    def first_call(self, node: Element):
+        # what a call site reaches is fixed once it has run: print, a linked function,
+        # or (for anything else) a lookup on every call
+        identifier = node.get('name')
+        if identifier == 'print':
+            node.call = self.call_print
+            self.stats['specialized_nodes'] += 1
+        elif identifier in self.interpreter.builtin_dict:
+            node.call = self.call_builtin
+        elif node.func is not None:
+            node.call = self.call_linked
+            self.stats['specialized_nodes'] += 1
+        else:
+            node.call = self.call
+        return node.call(node)
+
+    def call_print(self, node: Element):
+        self.interpreter.output("".join(str(arg.handler(arg)) for arg in node.arguments))
+
+    def call_builtin(self, node: Element):
+        return self.interpreter.call_builtin(node.get('name'), [arg.handler(arg) for arg in node.arguments])
+
+    def call_linked(self, node: Element):
+        return self.interpreter.call_function(node.func, [arg.handler(arg) for arg in node.arguments])
+
+    def call(self, node: Element):
+        func = self.interpreter.callee(node)
+        return self.interpreter.call_function(func, [arg.handler(arg) for arg in node.arguments])
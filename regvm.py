@@ -0,0 +1,589 @@
+"""
+Register compiler and VM for Brewin function bodies.
+
+A function body is lowered to a RegisterCode: a list of (opcode, a, b, c, x)
+instructions whose operands are register numbers, so `x = y + 1` is the single
+instruction ADD x, y, 1 rather than four stack operations. The registers of a call are
+its frame's slots (the function's locals, where callees find them by name), followed by
+the function's constants and then its temporaries.
+
+Usage: python regvm.py program.br [--scoping=static]    (prints the instructions of every function)
+"""
+
+import sys
+
+from intbase import InterpreterBase, ErrorType
+from environment import Environment, ENV_STATUS, ScopeRule
+from element import Element
+from objects import *
+from optimizer import walk
+
+# Opcodes, with the meaning of their operands; registers are r[...], other operands
+# index the named table. Every register read as an operand may hold an uninitialized
+# local, which is an error
+MOVE = 0                 # r[a] = r[b]
+ADD = 1                  # r[a] = r[b] + r[c]
+SUB = 2                  # r[a] = r[b] - r[c]
+COMPARE = 3              # r[a] = r[b] COMPARE_OPS[x] r[c]
+JUMP_UNLESS_COMPARE = 4  # jump to a unless r[b] COMPARE_OPS[x] r[c]
+JUMP_IF_FALSE = 5        # jump to a unless r[b], which must be a Bool
+JUMP = 6                 # jump to a
+DEFINE = 7               # r[a] = uninitialized; a var statement, r[a] must be unbound
+CLEAR = 8                # unbinds r[a] when its block ends
+LOAD_NAME = 9            # r[a] = names[x], looked up in the Environment
+STORE_NAME = 10          # names[x] = r[b]
+LOAD_DEREF = 11          # r[a] = cells[x] (static scoping: name, depth, slot)
+STORE_DEREF = 12         # cells[x] = r[b]
+LOAD_FUNCTION = 13       # r[a] = the function names[x]
+LOAD_FUNCTION_DEREF = 14  # r[a] = the function cells[x]
+CALL = 15                # r[a] = r[b](r[c], ..., r[c + x - 1])
+TAIL_CALL = 16           # like CALL, but replaces the current frame; a = 1 if made as a statement,
+                         # so the caller's result stays nil
+PRINT = 17               # print r[c], ..., r[c + x - 1]; r[a] = None
+INPUTI = 18              # r[a] = inputi(r[c], ..., r[c + x - 1])
+RETURN = 19              # return r[b]
+RETURN_NONE = 20
+NEGATE = 21
+
+OPNAMES = [
+    "MOVE", "ADD", "SUB", "COMPARE", "JUMP_UNLESS_COMPARE", "JUMP_IF_FALSE", "JUMP", "DEFINE",
+    "CLEAR", "LOAD_NAME", "STORE_NAME", "LOAD_DEREF", "STORE_DEREF", "LOAD_FUNCTION",
+    "LOAD_FUNCTION_DEREF", "CALL", "TAIL_CALL", "PRINT", "INPUTI", "RETURN", "RETURN_NONE", "NEGATE",
+]
+
+COMPARE_OPS = list(COMPARISONS)
+
+# Node types the compiler lowers; any other expression ('*', '/', '!', nil) evaluates to nil
+LOWERED = ['+', '-', *COMPARISONS, InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE,
+           InterpreterBase.QUALIFIED_NAME_NODE, InterpreterBase.FCALL_NODE, InterpreterBase.NEG_NODE,
+           InterpreterBase.VAR_DEF_NODE, InterpreterBase.ASSIGNMENT_NODE, InterpreterBase.IF_NODE,
+           InterpreterBase.WHILE_NODE, InterpreterBase.RETURN_NODE]
+
+
+class RegisterCode:
+    def __init__(self, name, code, consts, names, varnames, cells, temps):
+        self.name = name
+        self.code = code
+        self.consts = consts
+        self.names = names
+        self.varnames = varnames
+        self.cells = cells
+        # appended to the frame's slots on entry: the constant registers, then the temporaries
+        self.extra = consts + [None] * temps
+
+
+class RegisterCompiler:
+    """Lowers the statements of one function to a RegisterCode.
+
+    A local is used as an operand directly wherever its var statement is known to have
+    run in this frame (a parameter, or a var earlier in the same or an enclosing block);
+    it is then bound, if perhaps uninitialized. Anywhere else the name is looked up like
+    on the tree walker. Temporaries are allocated as a stack, so call arguments take
+    consecutive registers.
+    """
+
+    def __init__(self, func: FunctionObject, scope_rule=ScopeRule.DYNAMIC):
+        self.func = func
+        self.scope = func.scope
+        self.static = scope_rule is ScopeRule.STATIC
+        self.code = []
+        self.names = []
+        self.cells = []
+        self.visible = [{param: slot for slot, param in enumerate(func.params)}]
+
+        # constants live in the registers after the locals, temporaries after them
+        self.consts = []
+        for node in (node for statement in func.statements for node in walk(statement)):
+            if node.elem_type in [InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE]:
+                self.const(node.const)
+            elif node.elem_type == InterpreterBase.FCALL_NODE and node.func is not None:
+                self.const(node.func)
+            elif node.elem_type not in LOWERED:
+                self.const(None)
+        self.first_temp = self.free = len(self.scope) + len(self.consts)
+        self.temps = 0
+
+    def const(self, value) -> int:
+        for i, const in enumerate(self.consts):
+            if const is value:
+                return len(self.scope) + i
+        self.consts.append(value)
+        return len(self.scope) + len(self.consts) - 1
+
+    def temp(self) -> int:
+        register = self.free
+        self.free += 1
+        self.temps = max(self.temps, self.free - self.first_temp)
+        return register
+
+    def emit(self, op, a=0, b=0, c=0, x=0):
+        self.code.append((op, a, b, c, x))
+
+    def patch(self, at):
+        # points the jump emitted at `at` to the next instruction
+        op, _, b, c, x = self.code[at]
+        self.code[at] = (op, len(self.code), b, c, x)
+
+    def name_index(self, name):
+        if name not in self.names:
+            self.names.append(name)
+        return self.names.index(name)
+
+    def cell_index(self, identifier):
+        """Index of identifier's (name, depth, slot) cell, or None if it has no address."""
+        address = self.scope.parent.address(identifier) if self.static and identifier not in self.scope else None
+        if address is None:
+            return None
+        cell = (identifier, address[0] + 1, address[1])
+        if cell not in self.cells:
+            self.cells.append(cell)
+        return self.cells.index(cell)
+
+    def local(self, identifier):
+        """The register of the declaration of identifier visible here, or None."""
+        for block in reversed(self.visible):
+            if identifier in block:
+                return block[identifier]
+        return None
+
+    def compile_function(self) -> RegisterCode:
+        self.compile_statements(self.func.statements)
+        self.emit(RETURN_NONE)
+        return RegisterCode(self.func.name, self.code, self.consts, self.names, self.scope.names, self.cells, self.temps)
+
+    # Statements
+
+    def compile_statements(self, statements):
+        for statement in statements:
+            self.compile_statement(statement)
+            self.free = self.first_temp
+
+    def compile_block(self, statements):
+        # a nested block's vars are unbound again when it ends
+        self.visible.append({})
+        self.compile_statements(statements)
+        for slot in dict.fromkeys(self.visible.pop().values()):
+            self.emit(CLEAR, slot)
+
+    def compile_statement(self, node: Element):
+        match node.elem_type:
+            case InterpreterBase.VAR_DEF_NODE:
+                self.emit(DEFINE, node.slot)
+                self.visible[-1][node.get('name')] = node.slot
+            case InterpreterBase.ASSIGNMENT_NODE:
+                identifier = node.get('var')
+                register = self.local(identifier)
+                if register is not None:
+                    self.compile_expr(node.get('expression'), register)
+                    return
+                value = self.compile_expr(node.get('expression'))
+                cell = self.cell_index(identifier)
+                if cell is None:
+                    self.emit(STORE_NAME, b=value, x=self.name_index(identifier))
+                else:
+                    self.emit(STORE_DEREF, b=value, x=cell)
+            case InterpreterBase.FCALL_NODE:
+                self.compile_fcall(node)
+            case InterpreterBase.IF_NODE:
+                jump_unless = self.compile_condition(node.get('condition'))
+                self.compile_block(node.get('statements'))
+                if node.get('else_statements'):
+                    jump = len(self.code)
+                    self.emit(JUMP)
+                    self.patch(jump_unless)
+                    self.compile_block(node.get('else_statements'))
+                    self.patch(jump)
+                else:
+                    self.patch(jump_unless)
+            case InterpreterBase.WHILE_NODE:
+                top = len(self.code)
+                jump_unless = self.compile_condition(node.get('condition'))
+                self.compile_block(node.get('statements'))
+                self.emit(JUMP, top)
+                self.patch(jump_unless)
+            case InterpreterBase.RETURN_NODE:
+                expression = node.get('expression')
+                if expression is None:
+                    self.emit(RETURN_NONE)
+                elif expression.elem_type == InterpreterBase.FCALL_NODE and expression.tail:
+                    self.compile_fcall(expression)
+                else:
+                    self.emit(RETURN, b=self.compile_expr(expression))
+
+    def compile_condition(self, node: Element) -> int:
+        """Emits the test of an if or while; returns the index of its jump, to be patched."""
+        if node.elem_type in COMPARISONS:
+            op1, op2 = self.compile_operands(node)
+            self.emit(JUMP_UNLESS_COMPARE, 0, op1, op2, COMPARE_OPS.index(node.elem_type))
+        else:
+            self.emit(JUMP_IF_FALSE, 0, self.compile_expr(node))
+        return len(self.code) - 1
+
+    # Expressions
+
+    def in_register(self, node: Element):
+        """Whether node's value is already in a register: a visible local or a constant."""
+        if node.elem_type == InterpreterBase.QUALIFIED_NAME_NODE:
+            return self.local(node.get('name')) is not None
+        return node.elem_type in [InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE]
+
+    def compile_operands(self, node: Element):
+        # a local read as the first operand is copied (which checks it is initialized)
+        # before any code for the second runs, since that code could fail or change it
+        op1, op2 = node.get('op1'), node.get('op2')
+        register = self.compile_expr(op1)
+        if register < len(self.scope) and not self.in_register(op2):
+            register = self.compile_expr(op1, self.temp())
+        return register, self.compile_expr(op2)
+
+    def compile_expr(self, node: Element, target=None) -> int:
+        """Emits node's evaluation and returns the register holding its value: target if
+        given, otherwise a local, a constant or a new temporary."""
+        element_type = node.elem_type
+
+        if element_type in ['+', '-'] or element_type in COMPARISONS:
+            op1, op2 = self.compile_operands(node)
+            target = self.temp() if target is None else target
+            if element_type in COMPARISONS:
+                self.emit(COMPARE, target, op1, op2, COMPARE_OPS.index(element_type))
+            else:
+                self.emit(ADD if element_type == '+' else SUB, target, op1, op2)
+            return target
+        if element_type == InterpreterBase.FCALL_NODE:
+            return self.compile_fcall(node, target)
+
+        if element_type in [InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE]:
+            register = self.const(node.const)
+        elif element_type == InterpreterBase.QUALIFIED_NAME_NODE:
+            identifier = node.get('name')
+            register = self.local(identifier)
+            if register is None:
+                target = self.temp() if target is None else target
+                cell = self.cell_index(identifier)
+                if cell is None:
+                    self.emit(LOAD_NAME, target, x=self.name_index(identifier))
+                else:
+                    self.emit(LOAD_DEREF, target, x=cell)
+                return target
+        elif element_type == InterpreterBase.NEG_NODE:
+            target = self.temp() if target is None else target
+            self.emit(NEGATE, target)
+            return target
+        else:
+            # operators Brewin v1 does not implement evaluate to nil
+            register = self.const(None)
+
+        if target is not None:
+            # a MOVE onto itself still checks that the local is initialized
+            self.emit(MOVE, target, register)
+            return target
+        return register
+
+    def compile_fcall(self, node: Element, target=None) -> int:
+        identifier = node.get('name')
+        is_builtin = identifier in ('print', 'inputi')
+
+        callee = None
+        if node.func is not None:
+            callee = self.const(node.func)
+        elif not is_builtin:
+            callee = self.temp()
+            cell = self.cell_index(identifier)
+            if cell is None:
+                self.emit(LOAD_FUNCTION, callee, x=self.name_index(identifier))
+            else:
+                self.emit(LOAD_FUNCTION_DEREF, callee, x=cell)
+
+        args = node.get('args')
+        first = self.free
+        for arg in args:
+            register = self.temp()
+            self.compile_expr(arg, register)
+            self.free = register + 1
+        # the result may reuse the first argument's register, read before it is written
+        target = target if target is not None else first if args else self.temp()
+
+        if is_builtin:
+            self.emit(PRINT if identifier == 'print' else INPUTI, target, 0, first, len(args))
+        elif node.tail:
+            self.emit(TAIL_CALL, int(node.discard), callee, first, len(args))
+        else:
+            self.emit(CALL, target, callee, first, len(args))
+        return target
+
+
+class RegisterVM:
+    """Executes RegisterCode against the interpreter's Environment.
+
+    Calls between Brewin functions are handled inside the dispatch loop with an explicit
+    stack of suspended callers, so they do not recurse on the Python stack.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.env = interpreter.env
+
+    def run(self, func: FunctionObject):
+        registers = self.env.current_frame.slots
+        code = self.compile(func)
+        registers.extend(code.extra)
+        return self.execute(code, registers)
+
+    def compile(self, func: FunctionObject) -> RegisterCode:
+        if func.compiled is None:
+            func.compiled = RegisterCompiler(func, self.env.scope_rule).compile_function()
+        return func.compiled
+
+    def execute(self, code_object: RegisterCode, r):
+        env, interpreter, error = self.env, self.interpreter, self.interpreter.error
+        compare, boxed_int, boolean = interpreter.compare, Environment.interned.int, Environment.interned.bool
+        comparisons = [COMPARISONS[operator] for operator in COMPARE_OPS]
+        UNINIT, NOT_FOUND = OBJECT_TYPES.UNINITIALIZED, ENV_STATUS.IDENTIFIER_NOT_FOUND
+        code, names, varnames, cells = code_object.code, code_object.names, code_object.varnames, code_object.cells
+        frame_at = env.frame_at
+        pc = 0
+        callers = []
+
+        def uninitialized(register):
+            error(ErrorType.NAME_ERROR, f'Variable {varnames[register]} was defined but not initialized')
+
+        def operands(b, c):
+            # the slow path of an instruction with two operands, in evaluation order
+            if r[b] is UNINIT:
+                uninitialized(b)
+            if r[c] is UNINIT:
+                uninitialized(c)
+            return r[b], r[c]
+
+        while True:
+            op, a, b, c, x = code[pc]
+            pc += 1
+
+            if op == ADD:
+                val1, val2 = r[b], r[c]
+                if type(val1) is Int and type(val2) is Int:
+                    r[a] = boxed_int(val1.value + val2.value)
+                else:
+                    operands(b, c)
+                    error(ErrorType.TYPE_ERROR, '+ operation can only be applied to ints')
+            elif op == JUMP_UNLESS_COMPARE:
+                val1, val2 = r[b], r[c]
+                if type(val1) is Int and type(val2) is Int:
+                    if not comparisons[x](val1.value, val2.value):
+                        pc = a
+                elif not compare(COMPARE_OPS[x], *operands(b, c)).value:
+                    pc = a
+            elif op == MOVE:
+                value = r[b]
+                if value is UNINIT:
+                    uninitialized(b)
+                r[a] = value
+            elif op == SUB:
+                val1, val2 = r[b], r[c]
+                if type(val1) is Int and type(val2) is Int:
+                    r[a] = boxed_int(val1.value - val2.value)
+                else:
+                    operands(b, c)
+                    error(ErrorType.TYPE_ERROR, '+ operation can only be applied to ints')
+            elif op == JUMP:
+                pc = a
+            elif op == COMPARE:
+                val1, val2 = r[b], r[c]
+                if type(val1) is Int and type(val2) is Int:
+                    r[a] = boolean(comparisons[x](val1.value, val2.value))
+                else:
+                    r[a] = compare(COMPARE_OPS[x], *operands(b, c))
+            elif op == JUMP_IF_FALSE:
+                condition = r[b]
+                if type(condition) is not Bool:
+                    if condition is UNINIT:
+                        uninitialized(b)
+                    error(ErrorType.TYPE_ERROR, 'Condition of if or while must be a bool')
+                if not condition.value:
+                    pc = a
+            elif op == CALL:
+                func = r[b]
+                if x != func.arity:
+                    error(ErrorType.NAME_ERROR, f'{func.name}() takes {func.arity} arguments but {x} were given')
+                args = r[c:c + x]
+
+                callers.append((code, names, varnames, cells, pc, r, a))
+                env.push_frame(lexical_parent=func.lexical_parent, scope=func.scope)
+                code_object = func.compiled or self.compile(func)
+                r = env.current_frame.slots
+                r[:x] = args
+                r.extend(code_object.extra)
+                code, names, varnames, cells = code_object.code, code_object.names, code_object.varnames, code_object.cells
+                pc = 0
+            elif op == RETURN:
+                value = r[b]
+                if value is UNINIT:
+                    uninitialized(b)
+                if env.current_frame.discard:
+                    value = None
+                if not callers:
+                    return value
+                env.pop_frame()
+                code, names, varnames, cells, pc, r, a = callers.pop()
+                r[a] = value
+            elif op == RETURN_NONE:
+                if not callers:
+                    return None
+                env.pop_frame()
+                code, names, varnames, cells, pc, r, a = callers.pop()
+                r[a] = None
+            elif op == PRINT:
+                interpreter.output("".join(str(value) for value in r[c:c + x]))
+                r[a] = None
+            elif op == DEFINE:
+                if r[a] is not NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'Redefinition of {varnames[a]}')
+                r[a] = UNINIT
+            elif op == CLEAR:
+                r[a] = NOT_FOUND
+            elif op == TAIL_CALL:
+                func = r[b]
+                if x != func.arity:
+                    error(ErrorType.NAME_ERROR, f'{func.name}() takes {func.arity} arguments but {x} were given')
+                args = r[c:c + x]
+
+                # the callee takes over this frame's place; callers is left as it is
+                discard = a == 1 or env.current_frame.discard
+                env.pop_frame()
+                env.push_frame(lexical_parent=func.lexical_parent, scope=func.scope)
+                env.current_frame.discard = discard
+                code_object = func.compiled or self.compile(func)
+                r = env.current_frame.slots
+                r[:x] = args
+                r.extend(code_object.extra)
+                code, names, varnames, cells = code_object.code, code_object.names, code_object.varnames, code_object.cells
+                pc = 0
+            elif op == LOAD_NAME:
+                identifier = names[x]
+                value = env.retrieve(identifier=identifier)
+                if value is UNINIT:
+                    error(ErrorType.NAME_ERROR, f'Variable {identifier} was defined but not initialized')
+                elif value is NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f"Variable {identifier} has not been defined")
+                r[a] = value
+            elif op == STORE_NAME:
+                identifier, value = names[x], r[b]
+                if value is UNINIT:
+                    uninitialized(b)
+                if env.assign_identifier(identifier=identifier, value=value) == NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'Variable {identifier} has not been defined')
+            elif op == LOAD_FUNCTION:
+                identifier = names[x]
+                func = env.retrieve(identifier=identifier)
+                if type(func) is not FunctionObject:
+                    if func is NOT_FOUND:
+                        error(ErrorType.NAME_ERROR, f'{identifier} is not defined')
+                    error(ErrorType.TYPE_ERROR, f'{identifier} is not callable')
+                r[a] = func
+            elif op == LOAD_DEREF:
+                identifier, depth, slot = cells[x]
+                value = frame_at(depth).slots[slot]
+                if value is UNINIT:
+                    error(ErrorType.NAME_ERROR, f'Variable {identifier} was defined but not initialized')
+                elif value is NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f"Variable {identifier} has not been defined")
+                r[a] = value
+            elif op == STORE_DEREF:
+                identifier, depth, slot = cells[x]
+                value = r[b]
+                if value is UNINIT:
+                    uninitialized(b)
+                target = frame_at(depth).slots
+                if target[slot] is NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'Variable {identifier} has not been defined')
+                target[slot] = value
+            elif op == LOAD_FUNCTION_DEREF:
+                identifier, depth, slot = cells[x]
+                func = frame_at(depth).slots[slot]
+                if type(func) is not FunctionObject:
+                    if func is NOT_FOUND:
+                        error(ErrorType.NAME_ERROR, f'{identifier} is not defined')
+                    error(ErrorType.TYPE_ERROR, f'{identifier} is not callable')
+                r[a] = func
+            elif op == INPUTI:
+                r[a] = interpreter.call_builtin('inputi', r[c:c + x])
+            elif op == NEGATE:
+                error(ErrorType.NAME_ERROR)
+
+
+def register_name(code_object: RegisterCode, register):
+    locals_count = len(code_object.varnames)
+    if register < locals_count:
+        return code_object.varnames[register]
+    if register < locals_count + len(code_object.consts):
+        return const_repr(code_object.consts[register - locals_count])
+    return f"t{register - locals_count - len(code_object.consts)}"
+
+
+def const_repr(value):
+    if isinstance(value, FunctionObject):
+        return f"<function {value.name}>"
+    if isinstance(value, ObjectInterface):
+        return repr(value.value)
+    return repr(value)
+
+
+def disassemble(code_object: RegisterCode) -> str:
+    name = lambda register: f"r{register} ({register_name(code_object, register)})"
+    lines = []
+    for pc, (op, a, b, c, x) in enumerate(code_object.code):
+        if op in [ADD, SUB]:
+            operands = [name(a), name(b), name(c)]
+        elif op == COMPARE:
+            operands = [name(a), name(b), COMPARE_OPS[x], name(c)]
+        elif op == JUMP_UNLESS_COMPARE:
+            operands = [f"to {a}", name(b), COMPARE_OPS[x], name(c)]
+        elif op == JUMP_IF_FALSE:
+            operands = [f"to {a}", name(b)]
+        elif op == JUMP:
+            operands = [f"to {a}"]
+        elif op == MOVE:
+            operands = [name(a), name(b)]
+        elif op in [DEFINE, CLEAR, NEGATE]:
+            operands = [name(a)]
+        elif op in [LOAD_NAME, LOAD_FUNCTION]:
+            operands = [name(a), code_object.names[x]]
+        elif op in [LOAD_DEREF, LOAD_FUNCTION_DEREF]:
+            operands = [name(a), "{} @ depth {}, slot {}".format(*code_object.cells[x])]
+        elif op == STORE_NAME:
+            operands = [code_object.names[x], name(b)]
+        elif op == STORE_DEREF:
+            operands = ["{} @ depth {}, slot {}".format(*code_object.cells[x]), name(b)]
+        elif op in [CALL, TAIL_CALL, PRINT, INPUTI]:
+            operands = ([] if op == TAIL_CALL else [name(a)]) + ([name(b)] if op in [CALL, TAIL_CALL] else [])
+            operands.append(f"r{c}..r{c + x - 1}" if x else "no arguments")
+            if op == TAIL_CALL and a:
+                operands.append("result discarded")
+        elif op == RETURN:
+            operands = [name(b)]
+        else:
+            operands = []
+        lines.append(f"{pc:>6} {OPNAMES[op]:<20}{', '.join(operands)}".rstrip())
+    return "\n".join(lines)
+
+
+def main():
+    from brewparse import parse_program
+    from interpreterv1 import Interpreter
+
+    with open(sys.argv[1], encoding="utf-8") as handle:
+        program_node = parse_program(handle.read())
+
+    scoping = "static" if "--scoping=static" in sys.argv[2:] else "dynamic"
+    interpreter = Interpreter(backend="register", scoping=scoping)
+    interpreter.load_program(program_node)
+    for func in interpreter.functions.values():
+        code_object = interpreter.compiler.compile(func)
+        print(f"Instructions of {code_object.name}():")
+        print(disassemble(code_object))
+        print(f"  registers: {len(code_object.varnames)} locals, {len(code_object.consts)} constants, "
+              f"{len(code_object.extra) - len(code_object.consts)} temporaries\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+from intbase import InterpreterBase, ErrorType
+from element import Element
+from objects import COMPARISONS
+from optimizer import walk
+
+
+class Scope:
+    """Slot layout of one function: each parameter and var statement gets a fixed index.
+
+    A name declared again in a nested block gets another slot, which shadows the
+    earlier ones while the block runs. parent is the Scope the function is defined in
+    (the globals), used for lexical addressing.
+    """
+
+    def __init__(self, name, parent=None):
+        self.name = name
+        self.parent = parent
+        self.varnames: list[str] = []
+        self.slots: dict[str, list[int]] = {}
+
+    def __len__(self):
+        return len(self.varnames)
+
+    def __contains__(self, identifier):
+        return identifier in self.slots
+
+    def define(self, identifier) -> int:
+        slot = len(self.varnames)
+        self.varnames.append(identifier)
+        self.slots.setdefault(identifier, []).insert(0, slot)
+        return slot
+
+    def slot(self, identifier):
+        """The slot of a name declared exactly once, or None."""
+        slots = self.slots.get(identifier)
+        return slots[0] if slots is not None and len(slots) == 1 else None
+
+    def slots_of(self, identifier) -> list[int]:
+        """Every slot of a name, innermost declaration first."""
+        return self.slots.get(identifier, [])
+
+    def address(self, identifier):
+        """(depth, slot) of identifier, depth counting the scopes hopped outwards, or None."""
+        depth, scope = 0, self
+        while scope is not None:
+            slot = scope.slot(identifier)
+            if slot is not None:
+                return depth, slot
+            depth, scope = depth + 1, scope.parent
+        return None
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.varnames)
+
+
+class Resolver:
+    """Load-time name resolution pass for the compiled backends.
+
+    Builds a Scope for every function and reports the NAME_ERRORs that are certain
+    before anything runs: a var declared twice at the top of a function body, and a
+    variable that no function, parameter or var anywhere in the program declares
+    (under dynamic scoping any other name could still be bound by a caller). It also
+    collects the function names into the globals Scope, for lexical addressing.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.globals = Scope('<globals>')
+
+    def resolve_program(self, program_node: Element) -> dict[Element, Scope]:
+        functions = program_node.get('functions')
+        for func in functions:
+            if func.get('name') not in self.globals:
+                self.globals.define(func.get('name'))
+
+        declared = {func.get('name') for func in functions}
+        for func in functions:
+            declared.update(arg.get('name') for arg in func.get('args'))
+            declared.update(node.get('name') for node in walk(func)
+                            if node.elem_type == InterpreterBase.VAR_DEF_NODE)
+
+        return {func: self.resolve_function(func, declared) for func in functions}
+
+    def resolve_function(self, node: Element, declared) -> Scope:
+        scope = Scope(node.get('name'), self.globals)
+        block = {arg.get('name'): scope.define(arg.get('name')) for arg in node.get('args')}
+        self.resolve_block(node.get('statements'), scope, declared, block, top=True)
+        return scope
+
+    def resolve_block(self, statements, scope: Scope, declared, block: dict, top=False):
+        """Resolves one block; block maps the names it declared so far to their slots,
+        which each var statement records as node.slot."""
+        for statement in statements:
+            match statement.elem_type:
+                case InterpreterBase.VAR_DEF_NODE:
+                    identifier = statement.get('name')
+                    if identifier in block:
+                        # a nested block can be left early, so its redefinition fails at runtime
+                        if top:
+                            self.interpreter.error(ErrorType.NAME_ERROR, f'Redefinition of {identifier}')
+                        statement.slot = block[identifier]
+                    else:
+                        statement.slot = block[identifier] = scope.define(identifier)
+                case InterpreterBase.ASSIGNMENT_NODE:
+                    self.resolve_name(statement.get('var'), declared)
+                    self.resolve_expr(statement.get('expression'), declared)
+                case InterpreterBase.FCALL_NODE:
+                    self.resolve_expr(statement, declared)
+                case InterpreterBase.RETURN_NODE:
+                    if statement.get('expression') is not None:
+                        self.resolve_expr(statement.get('expression'), declared)
+                case InterpreterBase.IF_NODE:
+                    self.resolve_expr(statement.get('condition'), declared)
+                    self.resolve_block(statement.get('statements'), scope, declared, {})
+                    if statement.get('else_statements') is not None:
+                        self.resolve_block(statement.get('else_statements'), scope, declared, {})
+                case InterpreterBase.WHILE_NODE:
+                    self.resolve_expr(statement.get('condition'), declared)
+                    self.resolve_block(statement.get('statements'), scope, declared, {})
+
+    def resolve_expr(self, node: Element, declared):
+        # Only descend into the operands the interpreter actually evaluates
+        if node.elem_type in ['+', '-'] or node.elem_type in COMPARISONS:
+            self.resolve_expr(node.get('op1'), declared)
+            self.resolve_expr(node.get('op2'), declared)
+        elif node.elem_type == InterpreterBase.FCALL_NODE:
+            for arg in node.get('args'):
+                self.resolve_expr(arg, declared)
+        elif node.elem_type == InterpreterBase.QUALIFIED_NAME_NODE:
+            self.resolve_name(node.get('name'), declared)
+
+    def resolve_name(self, identifier, declared):
+        if identifier not in declared:
+            self.interpreter.error(ErrorType.NAME_ERROR, f"Variable {identifier} has not been defined")
@@ -20,8 +20,9 @@ from harness import (
 class TestScaffold(AbstractTestScaffold):
     """Implement scaffold for Brewin' interpreter; load file, validate syntax, run testcase."""
 
-    def __init__(self, interpreter_lib):
+    def __init__(self, interpreter_lib, interpreter_options=None):
         self.interpreter_lib = interpreter_lib
+        self.interpreter_options = interpreter_options or {}
 
     def setup(self, test_case):
         srcfile = itemgetter("srcfile")(
@@ -47,7 +48,9 @@ class TestScaffold(AbstractTestScaffold):
         stdin, expected, program = itemgetter("stdin", "expected", "program")(
             environment
         )
-        interpreter = self.interpreter_lib.Interpreter(False, stdin, False)
+        interpreter = self.interpreter_lib.Interpreter(
+            False, stdin, False, **self.interpreter_options
+        )
         try:
             interpreter.run(program)
         except Exception as exception:  # pylint: disable=broad-except
@@ -176,11 +179,15 @@ async def main():
     if not sys.argv:
         raise ValueError("Error: Missing version number argument")
     version = sys.argv[1]
-    zero_credit = len(sys.argv) > 2 and sys.argv[2] == '--zero-credit'
+    zero_credit = '--zero-credit' in sys.argv[2:]
+    # any other --key=value flags are forwarded to the Interpreter, e.g. --backend=closure
+    interpreter_options = dict(
+        arg[2:].split("=", 1) for arg in sys.argv[2:] if arg.startswith("--") and "=" in arg
+    )
     module_name = f"interpreterv{version}"
     interpreter = importlib.import_module(module_name)
 
-    scaffold = TestScaffold(interpreter)
+    scaffold = TestScaffold(interpreter, interpreter_options)
 
     match version:
         case "1":
@@ -0,0 +1,419 @@
+"""
+Threaded-code execution of register code.
+
+Each instruction of a function's RegisterCode (see regvm.py) is turned into a Python
+closure with its operands already bound, so running it takes no opcode dispatch at
+all. The closures are grouped into basic blocks; a block runs as
+`for handler in body: handler(r)` and its last instruction, the only one that can
+jump, returns the index of the block to run next.
+
+A Python call costs more than one test of an opcode if chain, so each handler is
+specialized while it is built: operands are bound as default arguments (read like
+locals), and an int constant operand is bound unboxed and never type-checked.
+"""
+
+from environment import Environment, ENV_STATUS
+from objects import *
+from regvm import *
+
+# Returned by a block exit instead of the next block's index
+DONE = -1
+TAIL = -2
+
+EXITS = [JUMP, JUMP_IF_FALSE, JUMP_UNLESS_COMPARE, RETURN, RETURN_NONE, TAIL_CALL]
+
+UNINIT, NOT_FOUND = OBJECT_TYPES.UNINITIALIZED, ENV_STATUS.IDENTIFIER_NOT_FOUND
+
+
+class ThreadedCode:
+    def __init__(self, blocks, extra):
+        # blocks are (tuple of handlers, exit handler) pairs
+        self.blocks = blocks
+        self.extra = extra
+
+
+class ThreadedVM:
+    """Runs functions as threaded register code.
+
+    Calls go through interpreter.call_function, so they recurse on the Python stack
+    like the closure backend; a tail call is handed back to run's loop instead.
+    """
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.env = interpreter.env
+        self.result = None
+        self.pending = None
+
+    def run(self, func: FunctionObject):
+        while True:
+            code = self.compile(func)
+            registers = self.env.current_frame.slots
+            registers.extend(code.extra)
+            if self.execute(code.blocks, registers) is DONE:
+                return self.result
+            func = self.pending[0]
+            self.interpreter.replace_frame(*self.pending)
+
+    @staticmethod
+    def execute(blocks, r):
+        index = 0
+        while True:
+            body, exit = blocks[index]
+            for handler in body:
+                handler(r)
+            index = exit(r)
+            if index < 0:
+                return index
+
+    def compile(self, func: FunctionObject) -> ThreadedCode:
+        if func.compiled is None:
+            code_object = RegisterCompiler(func, self.env.scope_rule).compile_function()
+            func.compiled = ThreadedCode(Threader(self, code_object).blocks(), code_object.extra)
+        return func.compiled
+
+
+class Threader:
+    """Builds the handlers of one RegisterCode."""
+
+    def __init__(self, vm: ThreadedVM, code_object: RegisterCode):
+        self.vm = vm
+        self.env = vm.env
+        self.interpreter = vm.interpreter
+        self.error = vm.interpreter.error
+        self.code_object = code_object
+        self.first_const = len(code_object.varnames)
+        # read when the handlers are built, since the intern range is configurable by
+        # replacing Environment.interned; an int result is boxed inline, the way
+        # InternTable.int does it, instead of calling it
+        interned = Environment.interned
+        self.boolean = interned.bool
+        self.ints, self.low, self.high = interned.ints, interned.low, interned.high
+
+    def blocks(self):
+        code = self.code_object.code
+        leaders = {0}
+        for pc, (op, a, _, _, _) in enumerate(code):
+            if op in [JUMP, JUMP_IF_FALSE, JUMP_UNLESS_COMPARE]:
+                leaders.add(a)
+            if op in EXITS:
+                leaders.add(pc + 1)
+        starts = sorted(pc for pc in leaders if pc < len(code))
+        block_of = {pc: index for index, pc in enumerate(starts)}
+
+        # a handler depends on nothing but its instruction, so repeated instructions
+        # (common in long straight-line functions) share one
+        handlers = {}
+        blocks, jumps = [], {}
+        for index, start in enumerate(starts):
+            end = starts[index + 1] if index + 1 < len(starts) else len(code)
+            *body, last = code[start:end]
+            if last[0] in EXITS:
+                exit = self.exit(*last, block_of, index + 1)
+                if last[0] == JUMP:
+                    jumps[index] = block_of[last[1]]
+            else:
+                body.append(last)
+                exit = self.fall_through(index + 1)
+            for instruction in body:
+                if instruction not in handlers:
+                    handlers[instruction] = self.handler(*instruction)
+            blocks.append((tuple(handlers[instruction] for instruction in body), exit))
+
+        # A jump to a block with no body, like a while loop's condition, takes that
+        # block's exit instead, so each iteration of the loop runs one block
+        for index, target in jumps.items():
+            seen = {index}
+            while target in jumps and not blocks[target][0] and target not in seen:
+                seen.add(target)
+                target = jumps[target]
+            if not blocks[target][0]:
+                blocks[index] = (blocks[index][0], blocks[target][1])
+        return blocks
+
+    @staticmethod
+    def fall_through(following):
+        return lambda r: following
+
+    def is_const(self, register):
+        """Whether register is one of the constant registers, which come before the
+        temporaries and are never written."""
+        return 0 <= register - self.first_const < len(self.code_object.consts)
+
+    def const(self, register):
+        """The constant register holds (nil is a constant too), or None if it is not a
+        constant register."""
+        return self.code_object.consts[register - self.first_const] if self.is_const(register) else None
+
+    def int_const(self, register):
+        """The unboxed value of register if it holds an int constant, else None."""
+        value = self.const(register)
+        return value.value if type(value) is Int else None
+
+    def uninitialized(self, register):
+        self.error(ErrorType.NAME_ERROR, f'Variable {self.code_object.varnames[register]} was defined but not initialized')
+
+    def operands(self, r, b, c):
+        # the slow path of an instruction with two operands, in evaluation order
+        if r[b] is UNINIT:
+            self.uninitialized(b)
+        if r[c] is UNINIT:
+            self.uninitialized(c)
+        return r[b], r[c]
+
+    def arith_error(self, r, b, c):
+        self.operands(r, b, c)
+        self.error(ErrorType.TYPE_ERROR, '+ operation can only be applied to ints')
+
+    # Block exits: each returns the index of the next block, DONE or TAIL
+
+    def exit(self, op, a, b, c, x, block_of, following):
+        vm, error, uninitialized = self.vm, self.error, self.uninitialized
+
+        if op == JUMP:
+            target = block_of[a]
+            return lambda r: target
+
+        if op == JUMP_UNLESS_COMPARE:
+            target, operator, compare = block_of[a], COMPARE_OPS[x], COMPARISONS[COMPARE_OPS[x]]
+            generic = self.interpreter.compare
+            k = self.int_const(c)
+            if k is not None:
+                def jump_unless_compare_const(r, b=b, k=k, following=following, target=target, Int=Int):
+                    val1 = r[b]
+                    if type(val1) is Int:
+                        return following if compare(val1.value, k) else target
+                    return following if generic(operator, *self.operands(r, b, c)).value else target
+                return jump_unless_compare_const
+
+            def jump_unless_compare(r, b=b, c=c, following=following, target=target, Int=Int):
+                val1, val2 = r[b], r[c]
+                if type(val1) is Int and type(val2) is Int:
+                    return following if compare(val1.value, val2.value) else target
+                return following if generic(operator, *self.operands(r, b, c)).value else target
+            return jump_unless_compare
+
+        if op == JUMP_IF_FALSE:
+            target = block_of[a]
+
+            def jump_if_false(r, b=b, following=following, target=target, Bool=Bool):
+                condition = r[b]
+                if type(condition) is not Bool:
+                    if condition is UNINIT:
+                        uninitialized(b)
+                    error(ErrorType.TYPE_ERROR, 'Condition of if or while must be a bool')
+                return following if condition.value else target
+            return jump_if_false
+
+        if op == RETURN:
+            def return_(r):
+                value = r[b]
+                if value is UNINIT:
+                    uninitialized(b)
+                vm.result = value
+                return DONE
+            return return_
+
+        if op == RETURN_NONE:
+            def return_none(r):
+                vm.result = None
+                return DONE
+            return return_none
+
+        # TAIL_CALL: the callee replaces this frame in run's loop
+        def tail_call(r):
+            vm.pending = (r[b], r[c:c + x], a == 1)
+            return TAIL
+        return tail_call
+
+    # Straight-line instructions
+
+    def handler(self, op, a, b, c, x):
+        if op == ADD:
+            return self.add(a, b, c)
+        if op == SUB:
+            return self.sub(a, b, c)
+        if op == COMPARE:
+            return self.compare(a, b, c, x)
+        if op == MOVE:
+            if self.is_const(b):
+                # a constant register is never uninitialized
+                def move_const(r, a=a, value=self.const(b)):
+                    r[a] = value
+                return move_const
+
+            def move(r, a=a, b=b):
+                value = r[b]
+                if value is UNINIT:
+                    self.uninitialized(b)
+                r[a] = value
+            return move
+
+        env, interpreter, error, code_object = self.env, self.interpreter, self.error, self.code_object
+        if op == DEFINE:
+            identifier = code_object.varnames[a]
+
+            def define(r):
+                if r[a] is not NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'Redefinition of {identifier}')
+                r[a] = UNINIT
+            return define
+        if op == CLEAR:
+            def clear(r):
+                r[a] = NOT_FOUND
+            return clear
+        if op in [LOAD_NAME, LOAD_DEREF]:
+            if op == LOAD_NAME:
+                identifier = code_object.names[x]
+                lookup = lambda: env.retrieve(identifier=identifier)
+            else:
+                identifier, depth, slot = code_object.cells[x]
+                lookup = lambda: env.frame_at(depth).slots[slot]
+
+            def load(r):
+                value = lookup()
+                if value is UNINIT:
+                    error(ErrorType.NAME_ERROR, f'Variable {identifier} was defined but not initialized')
+                elif value is NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f"Variable {identifier} has not been defined")
+                r[a] = value
+            return load
+        if op == STORE_NAME:
+            identifier = code_object.names[x]
+
+            def store_name(r):
+                value = r[b]
+                if value is UNINIT:
+                    self.uninitialized(b)
+                if env.assign_identifier(identifier=identifier, value=value) == NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'Variable {identifier} has not been defined')
+            return store_name
+        if op == STORE_DEREF:
+            identifier, depth, slot = code_object.cells[x]
+
+            def store_deref(r):
+                value = r[b]
+                if value is UNINIT:
+                    self.uninitialized(b)
+                target = env.frame_at(depth).slots
+                if target[slot] is NOT_FOUND:
+                    error(ErrorType.NAME_ERROR, f'Variable {identifier} has not been defined')
+                target[slot] = value
+            return store_deref
+        if op in [LOAD_FUNCTION, LOAD_FUNCTION_DEREF]:
+            if op == LOAD_FUNCTION:
+                identifier = code_object.names[x]
+                lookup = lambda: env.retrieve(identifier=identifier)
+            else:
+                identifier, depth, slot = code_object.cells[x]
+                lookup = lambda: env.frame_at(depth).slots[slot]
+
+            def load_function(r):
+                func = lookup()
+                if type(func) is not FunctionObject:
+                    if func is NOT_FOUND:
+                        error(ErrorType.NAME_ERROR, f'{identifier} is not defined')
+                    error(ErrorType.TYPE_ERROR, f'{identifier} is not callable')
+                r[a] = func
+            return load_function
+        if op == CALL:
+            def call(r, a=a, b=b, c=c, end=c + x, call_function=interpreter.call_function):
+                r[a] = call_function(r[b], r[c:end])
+            return call
+        if op == PRINT:
+            def print_(r, a=a, c=c, end=c + x, output=interpreter.output):
+                output("".join(str(value) for value in r[c:end]))
+                r[a] = None
+            return print_
+        if op == INPUTI:
+            def inputi(r):
+                r[a] = interpreter.call_builtin('inputi', r[c:c + x])
+            return inputi
+
+        # NEGATE
+        def negate(r):
+            error(ErrorType.NAME_ERROR)
+        return negate
+
+    def add(self, a, b, c):
+        k1, k2 = self.int_const(b), self.int_const(c)
+        ints, low, high = self.ints, self.low, self.high
+        if k2 is not None:
+            def add_const(r, a=a, b=b, k=k2, Int=Int, ints=ints, low=low, high=high):
+                val1 = r[b]
+                if type(val1) is Int:
+                    value = val1.value + k
+                    r[a] = ints[value - low] if low <= value <= high else Int(None, value)
+                else:
+                    self.arith_error(r, b, c)
+            return add_const
+        if k1 is not None:
+            def const_add(r, a=a, c=c, k=k1, Int=Int, ints=ints, low=low, high=high):
+                val2 = r[c]
+                if type(val2) is Int:
+                    value = k + val2.value
+                    r[a] = ints[value - low] if low <= value <= high else Int(None, value)
+                else:
+                    self.arith_error(r, b, c)
+            return const_add
+
+        def add(r, a=a, b=b, c=c, Int=Int, ints=ints, low=low, high=high):
+            val1, val2 = r[b], r[c]
+            if type(val1) is Int and type(val2) is Int:
+                value = val1.value + val2.value
+                r[a] = ints[value - low] if low <= value <= high else Int(None, value)
+            else:
+                self.arith_error(r, b, c)
+        return add
+
+    def sub(self, a, b, c):
+        k1, k2 = self.int_const(b), self.int_const(c)
+        ints, low, high = self.ints, self.low, self.high
+        if k2 is not None:
+            def sub_const(r, a=a, b=b, k=k2, Int=Int, ints=ints, low=low, high=high):
+                val1 = r[b]
+                if type(val1) is Int:
+                    value = val1.value - k
+                    r[a] = ints[value - low] if low <= value <= high else Int(None, value)
+                else:
+                    self.arith_error(r, b, c)
+            return sub_const
+        if k1 is not None:
+            def const_sub(r, a=a, c=c, k=k1, Int=Int, ints=ints, low=low, high=high):
+                val2 = r[c]
+                if type(val2) is Int:
+                    value = k - val2.value
+                    r[a] = ints[value - low] if low <= value <= high else Int(None, value)
+                else:
+                    self.arith_error(r, b, c)
+            return const_sub
+
+        def sub(r, a=a, b=b, c=c, Int=Int, ints=ints, low=low, high=high):
+            val1, val2 = r[b], r[c]
+            if type(val1) is Int and type(val2) is Int:
+                value = val1.value - val2.value
+                r[a] = ints[value - low] if low <= value <= high else Int(None, value)
+            else:
+                self.arith_error(r, b, c)
+        return sub
+
+    def compare(self, a, b, c, x):
+        operator, compare = COMPARE_OPS[x], COMPARISONS[COMPARE_OPS[x]]
+        generic, boolean = self.interpreter.compare, self.boolean
+        k = self.int_const(c)
+        if k is not None:
+            def compare_const(r, a=a, b=b, k=k, Int=Int, boolean=boolean):
+                val1 = r[b]
+                if type(val1) is Int:
+                    r[a] = boolean(compare(val1.value, k))
+                else:
+                    r[a] = generic(operator, *self.operands(r, b, c))
+            return compare_const
+
+        def compare_(r, a=a, b=b, c=c, Int=Int, boolean=boolean):
+            val1, val2 = r[b], r[c]
+            if type(val1) is Int and type(val2) is Int:
+                r[a] = boolean(compare(val1.value, val2.value))
+            else:
+                r[a] = generic(operator, *self.operands(r, b, c))
+        return compare_
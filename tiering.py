@@ -0,0 +1,97 @@
+"""
+Tiered execution: every function starts on the tree walker and is promoted to
+generated Python code once it has been called tier_threshold times.
+
+A function that runs once, like main, never pays for resolution or compilation. A
+promoted function runs in a slot frame like on the python backend; frames of both
+kinds can be on the stack at once, since lookups from other frames go by name.
+"""
+
+import time
+
+from intbase import InterpreterBase
+from environment import CONTROL
+from element import Element
+from objects import *
+from optimizer import walk
+from resolver import Resolver
+from transpiler import PythonTranspiler
+
+
+class Unresolvable(Exception):
+    pass
+
+
+class TieredEvaluator:
+    """Runs each function on its current tier and promotes hot ones.
+
+    interpreter.stats['tiers'] maps each function that has been called to its 'tier'
+    ("tree" or "python"), its 'calls' and the seconds spent promoting it
+    ('compile_time'); stats['promoted_functions'] counts the promotions.
+    """
+
+    def __init__(self, interpreter, threshold):
+        self.interpreter = interpreter
+        self.env = interpreter.env
+        self.threshold = int(threshold)
+        self.transpiler = PythonTranspiler(interpreter)
+        self.resolver = Resolver(self)
+        self.definitions: dict[str, Element] = {}
+        self.declared = set()
+        self.tiers = interpreter.stats['tiers'] = {}
+        interpreter.stats['promoted_functions'] = 0
+
+    def load_program(self, program_node: Element):
+        functions = program_node.get('functions')
+        self.definitions = {func.get('name'): func for func in functions}
+        for func in functions:
+            self.resolver.globals.define(func.get('name'))
+
+        self.declared = set(self.definitions)
+        for func in functions:
+            self.declared.update(arg.get('name') for arg in func.get('args'))
+            self.declared.update(node.get('name') for node in walk(func)
+                                 if node.elem_type == InterpreterBase.VAR_DEF_NODE)
+
+    def error(self, error_type, description=None):
+        # the Resolver reports through here; the tree walker raises the error instead,
+        # when (and if) the function actually reaches it
+        raise Unresolvable(description)
+
+    def count(self, func: FunctionObject):
+        """Counts a call to func, about to enter its frame, and promotes it at the threshold."""
+        tier = self.tiers.get(func.name)
+        if tier is None:
+            tier = self.tiers[func.name] = {'tier': "tree", 'calls': 0, 'compile_time': 0.0}
+        tier['calls'] += 1
+        if tier['calls'] == self.threshold:
+            self.promote(func, tier)
+
+    def promote(self, func: FunctionObject, tier):
+        start = time.perf_counter()
+        try:
+            scope = self.resolver.resolve_function(self.definitions[func.name], self.declared)
+        except Unresolvable:
+            return
+        func.scope = scope
+        self.transpiler.compile(func)
+        tier['tier'] = "python"
+        tier['compile_time'] = time.perf_counter() - start
+        self.interpreter.stats['promoted_functions'] += 1
+
+    def run(self, func: FunctionObject):
+        # a tail call may move to a function on the other tier; replace_frame counts it
+        interpreter = self.interpreter
+        while True:
+            if func.compiled is not None:
+                result = func.compiled(self.env.current_frame.slots)
+                if result is not CONTROL.TAIL_CALL:
+                    return result
+                pending = self.transpiler.pending
+            else:
+                status = interpreter.eval_block(func.statements)
+                if status is not CONTROL.TAIL_CALL:
+                    return interpreter.return_value if status is CONTROL.RETURN else None
+                pending = interpreter.pending_call
+            func = pending[0]
+            interpreter.replace_frame(*pending)
@@ -0,0 +1,266 @@
+"""
+Trace compilation of hot while loops, for the tree walker.
+
+Once a loop has run trace_loops iterations, the tree walker records which way every if
+in the next iteration went. That path through the body becomes a Python function
+over unboxed ints, strings and bools, with a guard wherever the recorded path could
+be left. The trace runs whole iterations until the loop ends or a guard fails. A
+failed guard rolls the iteration back and hands it to the tree walker. The trace's
+own output is buffered until the iteration's last guard has passed, and no call or
+error can happen on a traced path, so nothing needs to be undone.
+"""
+
+from intbase import InterpreterBase
+from environment import Environment, ENV_STATUS
+from element import Element
+from objects import *
+
+TYPES = {Int: 'int', String: 'str', Bool: 'bool'}
+BOX = {'int': 'int', 'str': 'string', 'bool': 'bool'}
+
+# Side exits a trace may take before it is dropped, if it fails more often than it
+# completes an iteration
+EXIT_ALLOWANCE = 8
+
+
+class NotTraceable(Exception):
+    pass
+
+
+class Trace:
+    def __init__(self, function, entry, written):
+        # entry is (identifier, type) per variable read on entry; written is
+        # (identifier, box) per variable handed back on exit
+        self.function = function
+        self.entry = entry
+        self.written = written
+        self.iterations = 0
+        self.exits = 0
+
+
+class TraceCompiler:
+    """Generates the Python source of one loop's trace.
+
+    Variables declared outside the loop are read once on entry into the locals named
+    in self.outer, with the types they have then (self.entry), and the ones the trace assigns are
+    handed back on exit. Anything the trace cannot run without a call, an error or a
+    change of type raises NotTraceable.
+    """
+
+    def __init__(self, node: Element, branches, env):
+        self.node = node
+        self.branches = branches
+        self.env = env
+        self.visible = []
+        self.outer = {}
+        self.entry = {}
+        self.types = {}
+        self.written = []
+        self.counter = 0
+
+    def local(self, identifier):
+        self.counter += 1
+        return f"{identifier}_{self.counter}"
+
+    def source(self) -> str:
+        condition, kind = self.expression(self.node.get('condition'))
+        if kind != 'bool':
+            raise NotTraceable
+        body = []
+        self.block(self.node.get('statements'), body)
+        # the next iteration must start with the types this one did
+        if any(self.types[name] != kind for name, kind in self.entry.items()):
+            raise NotTraceable
+
+        names = list(self.outer.values())
+        written = [name for name in names if name in self.written]
+        saved = f"({', '.join(written)},)" if written else "()"
+
+        lines = ["def trace(values, _output):"]
+        if names:
+            lines.append(f"    {', '.join(names)}, = values")
+        lines += ["    iterations = 0", f"    while {condition}:"]
+        last_guard = max((i for i, (kind, _) in enumerate(body) if kind == 'guard'), default=-1)
+        if last_guard >= 0:
+            lines.append(f"        saved = {saved}")
+        buffered = any(kind == 'print' for kind, _ in body[:last_guard])
+        if buffered:
+            lines.insert(1, "    out = []")
+        for i, (kind, line) in enumerate(body):
+            if kind == 'guard':
+                lines.append(f"        if {line}:")
+                lines.append("            return False, saved, iterations")
+                if i == last_guard and buffered:
+                    lines += ["        for line in out:", "            _output(line)", "        out.clear()"]
+            elif kind == 'print':
+                lines.append(f"        {'out.append' if i < last_guard else '_output'}({line})")
+            else:
+                lines.append(f"        {line}")
+        lines.append("        iterations += 1")
+        lines.append(f"    return True, {saved}, iterations")
+        return "\n".join(lines) + "\n"
+
+    # Variables
+
+    def lookup(self, identifier):
+        for block in reversed(self.visible):
+            if identifier in block:
+                return block[identifier]
+        if identifier not in self.outer:
+            value = self.env.retrieve(identifier=identifier)
+            if value is ENV_STATUS.IDENTIFIER_NOT_FOUND or type(value) not in TYPES:
+                raise NotTraceable
+            name = self.outer[identifier] = self.local(identifier)
+            self.types[name] = self.entry[name] = TYPES[type(value)]
+        return self.outer[identifier]
+
+    # Statements, as ('line' | 'guard' | 'print', source) items
+
+    def block(self, statements, body):
+        self.visible.append({})
+        for statement in statements:
+            self.statement(statement, body)
+        self.visible.pop()
+
+    def statement(self, node: Element, body):
+        match node.elem_type:
+            case InterpreterBase.VAR_DEF_NODE:
+                identifier = node.get('name')
+                if identifier in self.visible[-1]:
+                    raise NotTraceable
+                name = self.visible[-1][identifier] = self.local(identifier)
+                self.types[name] = None
+            case InterpreterBase.ASSIGNMENT_NODE:
+                source, kind = self.expression(node.get('expression'))
+                name = self.lookup(node.get('var'))
+                self.types[name] = kind
+                if name in self.outer.values():
+                    self.written.append(name)
+                body.append(('line', f"{name} = {source}"))
+            case InterpreterBase.FCALL_NODE if node.get('name') == 'print':
+                parts = [self.text(*self.expression(arg)) for arg in node.get('args')]
+                body.append(('print', " + ".join(parts) if parts else "''"))
+            case InterpreterBase.IF_NODE if node in self.branches:
+                condition, kind = self.expression(node.get('condition'))
+                if kind != 'bool':
+                    raise NotTraceable
+                taken = self.branches[node]
+                body.append(('guard', f"not {condition}" if taken else condition))
+                statements = node.get('statements') if taken else node.get('else_statements')
+                if statements:
+                    self.block(statements, body)
+            case _:
+                raise NotTraceable
+
+    # Expressions, as (source, type)
+
+    def expression(self, node: Element):
+        element_type = node.elem_type
+        if element_type == InterpreterBase.INT_NODE:
+            return repr(node.get('val')), 'int'
+        if element_type == InterpreterBase.STRING_NODE:
+            return repr(node.get('val')), 'str'
+        if element_type == InterpreterBase.BOOL_NODE:
+            return repr(bool(node.get('val'))), 'bool'
+        if element_type == InterpreterBase.QUALIFIED_NAME_NODE:
+            name = self.lookup(node.get('name'))
+            if self.types[name] is None:
+                raise NotTraceable
+            return name, self.types[name]
+
+        if element_type in ['+', '-'] or element_type in COMPARISONS:
+            (source1, kind1), (source2, kind2) = self.expression(node.get('op1')), self.expression(node.get('op2'))
+            if element_type in ['==', '!='] and kind1 != kind2:
+                return repr(element_type == '!='), 'bool'
+            if element_type not in ['==', '!='] and (kind1 != 'int' or kind2 != 'int'):
+                raise NotTraceable
+            return f"({source1} {element_type} {source2})", 'int' if element_type in ['+', '-'] else 'bool'
+        raise NotTraceable
+
+    @staticmethod
+    def text(source, kind):
+        if kind == 'int':
+            return f"str({source})"
+        if kind == 'bool':
+            return f"('true' if {source} else 'false')"
+        return source
+
+
+class LoopTracer:
+    """Decides when each while loop is recorded, compiled and run as a trace.
+
+    Counts 'traces_compiled', 'traced_iterations', 'trace_exits' (guards that failed)
+    and 'traces_dropped' in interpreter.stats.
+    """
+
+    def __init__(self, interpreter, threshold):
+        self.interpreter = interpreter
+        self.env = interpreter.env
+        self.threshold = int(threshold)
+        self.traces: dict[Element, Trace | None] = {}
+        self.recording = None
+        self.branches = {}
+        self.stats = interpreter.stats
+        for key in ['traces_compiled', 'traced_iterations', 'trace_exits', 'traces_dropped']:
+            self.stats[key] = 0
+
+    def record(self, node: Element, taken):
+        if self.recording is not None:
+            self.branches[node] = taken
+
+    def leave(self, node: Element):
+        if self.recording is node:
+            self.recording = None
+
+    def enter(self, node: Element, iterations) -> bool:
+        """Called before each iteration of node; runs the rest of the loop as a trace if
+        there is one and returns True if that finished the loop."""
+        if node not in self.traces:
+            if iterations < self.threshold or (self.recording is not None and self.recording is not node):
+                return False
+            if self.recording is None:
+                self.recording, self.branches = node, {}
+                return False
+            self.recording = None
+            self.traces[node] = self.compile(node)
+
+        trace = self.traces[node]
+        return trace is not None and self.run(node, trace)
+
+    def compile(self, node: Element):
+        compiler = TraceCompiler(node, self.branches, self.env)
+        try:
+            source = compiler.source()
+        except NotTraceable:
+            return None
+        namespace = {}
+        exec(compile(source, "<brewin trace>", "exec"), namespace)
+        self.stats['traces_compiled'] += 1
+        entry = [(identifier, compiler.entry[name]) for identifier, name in compiler.outer.items()]
+        # boxing goes through the intern table in use when the trace is compiled
+        written = [(identifier, getattr(Environment.interned, BOX[compiler.entry[name]]))
+                   for identifier, name in compiler.outer.items()
+                   if name in compiler.written]
+        return Trace(namespace['trace'], entry, written)
+
+    def run(self, node: Element, trace: Trace) -> bool:
+        values = []
+        for identifier, kind in trace.entry:
+            value = self.env.retrieve(identifier=identifier)
+            if TYPES.get(type(value)) != kind:
+                return False
+            values.append(value.value)
+
+        finished, written, iterations = trace.function(values, self.interpreter.output)
+        for (identifier, box), value in zip(trace.written, written):
+            self.env.assign_identifier(identifier=identifier, value=box(value))
+
+        trace.iterations += iterations
+        self.stats['traced_iterations'] += iterations
+        if not finished:
+            trace.exits += 1
+            self.stats['trace_exits'] += 1
+            if trace.exits > EXIT_ALLOWANCE and trace.exits > trace.iterations:
+                self.traces[node] = None
+                self.stats['traces_dropped'] += 1
+        return finished
@@ -0,0 +1,396 @@
+"""
+Transpiler from Brewin function bodies to Python source.
+
+Each Brewin function becomes one Python function of its frame's slot list, compiled
+with compile() and exec'd, so CPython runs the body and cProfile reports Brewin
+functions by name. A Brewin return is a Python return; a tail call returns
+CONTROL.TAIL_CALL to the run loop instead.
+
+Usage: python transpiler.py program.br [--scoping=static]    (prints the Python source of every function)
+"""
+
+import functools
+import keyword
+import sys
+
+from intbase import InterpreterBase, ErrorType
+from environment import Environment, ENV_STATUS, ScopeRule, CONTROL
+from element import Element
+from objects import *
+from optimizer import walk, summarize_function, reachable_free_names
+
+# Generated source already compiled, by any interpreter in the process, is not compiled
+# again while it is among the CODE_CACHE_SIZE most recently used
+CODE_CACHE_SIZE = 256
+
+
+@functools.lru_cache(maxsize=CODE_CACHE_SIZE)
+def compile_source(source, name):
+    return compile(source, f"<brewin {name}>", "exec")
+
+
+class FunctionTranspiler:
+    """Generates the Python source of one Brewin function.
+
+    Every use of a variable is resolved at compile time to the declaration visible at
+    that point, or to a lookup by name if there is none. A variable no other function
+    can see becomes a Python local named <name>_<slot>; the rest stay in the frame's
+    slots, where callees find them by name. Literals and call targets are referenced
+    through constants _k0, _k1, ... in the function's namespace.
+    """
+
+    def __init__(self, func: FunctionObject, python_locals):
+        self.func = func
+        self.python_locals = python_locals
+        self.lines = []
+        self.depth = 1
+        self.constants = []
+        self.visible = [{}]
+
+    def emit(self, line):
+        self.lines.append("    " * self.depth + line)
+
+    def constant(self, value):
+        for i, const in enumerate(self.constants):
+            if const is value:
+                return f"_k{i}"
+        self.constants.append(value)
+        return f"_k{len(self.constants) - 1}"
+
+    def python_name(self):
+        name = self.func.name
+        return f"{name}_" if keyword.iskeyword(name) or name.startswith('_') else name
+
+    def source(self) -> str:
+        self.emit_entry()
+        self.emit_statements(self.func.statements)
+        self.emit("return None")
+        return f"def {self.python_name()}(slots):\n" + "\n".join(self.lines) + "\n"
+
+    def emit_entry(self):
+        for slot, param in enumerate(self.func.params):
+            self.visible[0][param] = slot
+            if param in self.python_locals:
+                self.emit(f"{param}_{slot} = slots[{slot}]")
+
+    # Variables
+
+    def lookup(self, identifier):
+        """The slot of the declaration of identifier visible here, or None."""
+        for block in reversed(self.visible):
+            if identifier in block:
+                return block[identifier]
+        return None
+
+    def location(self, identifier, slot):
+        return f"{identifier}_{slot}" if identifier in self.python_locals else f"slots[{slot}]"
+
+    def load(self, identifier):
+        slot = self.lookup(identifier)
+        if slot is None:
+            return f"_load({identifier!r})"
+        location = self.location(identifier, slot)
+        return f"({location} if {location} is not _UNINIT else _uninit({identifier!r}))"
+
+    def local_int(self, node: Element):
+        """The location of a variable node declared here, whose Int can be read directly."""
+        if node.elem_type != InterpreterBase.QUALIFIED_NAME_NODE:
+            return None
+        slot = self.lookup(node.get('name'))
+        return None if slot is None else self.location(node.get('name'), slot)
+
+    # Statements
+
+    def emit_statements(self, statements):
+        for statement in statements:
+            self.emit_statement(statement)
+
+    def emit_block(self, statements):
+        # a nested block: its vars are visible until it ends, and those in slots are
+        # unbound again for callees
+        self.depth += 1
+        self.visible.append({})
+        self.emit_statements(statements)
+        for identifier, slot in self.visible.pop().items():
+            if identifier not in self.python_locals:
+                self.emit(f"slots[{slot}] = _NOT_FOUND")
+        if self.lines[-1].strip().endswith(':'):
+            self.emit("pass")
+        self.depth -= 1
+
+    def emit_statement(self, node: Element):
+        match node.elem_type:
+            case InterpreterBase.VAR_DEF_NODE:
+                identifier = node.get('name')
+                if identifier in self.visible[-1]:
+                    # declared earlier in this block, which always runs first
+                    self.emit(f"_redefined({identifier!r})")
+                    return
+                self.visible[-1][identifier] = node.slot
+                self.emit(f"{self.location(identifier, node.slot)} = _UNINIT")
+            case InterpreterBase.ASSIGNMENT_NODE:
+                identifier = node.get('var')
+                value = self.value(node.get('expression'))
+                slot = self.lookup(identifier)
+                if slot is None:
+                    self.emit(f"_store({identifier!r}, {value})")
+                else:
+                    self.emit(f"{self.location(identifier, slot)} = {value}")
+            case InterpreterBase.FCALL_NODE if node.tail:
+                self.emit(f"return {self.tail_call(node)}")
+            case InterpreterBase.FCALL_NODE:
+                self.emit(self.call(node))
+            case InterpreterBase.IF_NODE:
+                self.emit(f"if {self.condition(node.get('condition'), 'if')}:")
+                self.emit_block(node.get('statements'))
+                if node.get('else_statements'):
+                    self.emit("else:")
+                    self.emit_block(node.get('else_statements'))
+            case InterpreterBase.WHILE_NODE:
+                self.emit(f"while {self.condition(node.get('condition'), 'while')}:")
+                self.emit_block(node.get('statements'))
+            case InterpreterBase.RETURN_NODE:
+                expression = node.get('expression')
+                if expression is None:
+                    self.emit("return None")
+                elif expression.elem_type == InterpreterBase.FCALL_NODE and expression.tail:
+                    self.emit(f"return {self.tail_call(expression)}")
+                else:
+                    self.emit(f"return {self.value(expression)}")
+
+    # Expressions
+
+    def value(self, node: Element) -> str:
+        """A Python expression for the Brewin value of node."""
+        element_type = node.elem_type
+        if element_type in [InterpreterBase.INT_NODE, InterpreterBase.STRING_NODE, InterpreterBase.BOOL_NODE]:
+            return self.constant(node.const)
+        if element_type in ['+', '-']:
+            return f"_box({self.raw_int(node)})"
+        if element_type in COMPARISONS:
+            return f"(_TRUE if {self.compare(node)} else _FALSE)"
+        if element_type == InterpreterBase.QUALIFIED_NAME_NODE:
+            return self.load(node.get('name'))
+        if element_type == InterpreterBase.FCALL_NODE:
+            return self.call(node)
+        if element_type == InterpreterBase.NEG_NODE:
+            return "_neg()"
+        return "None"
+
+    @staticmethod
+    def produces_int(node: Element):
+        return node.elem_type in ['+', '-', InterpreterBase.INT_NODE]
+
+    def raw_int(self, node: Element) -> str:
+        """A Python expression for the native int of an int-valued node (+, - or an int
+        literal). Operands that may not be Ints go through _arith, which checks both
+        once both are evaluated, like the tree walker."""
+        if node.elem_type == InterpreterBase.INT_NODE:
+            return repr(node.get('val'))
+
+        op1, op2, operator = node.get('op1'), node.get('op2'), node.elem_type
+        if self.produces_int(op1) and self.produces_int(op2):
+            return f"({self.raw_int(op1)} {operator} {self.raw_int(op2)})"
+
+        operand1 = self.raw_int(op1) if self.produces_int(op1) else self.value(op1)
+        operand2 = self.raw_int(op2) if self.produces_int(op2) else self.value(op2)
+        general = f"_arith({operator!r}, {operand1}, {operand2})"
+
+        # a local and a literal or another local read the Int straight from the variable
+        local1, local2 = self.local_int(op1), self.local_int(op2)
+        if local1 is not None and op2.elem_type == InterpreterBase.INT_NODE:
+            return f"({local1}.value {operator} {operand2} if _type({local1}) is _Int else {general})"
+        if local1 is not None and local2 is not None:
+            return (f"({local1}.value {operator} {local2}.value if _type({local1}) is _Int and _type({local2}) is _Int "
+                    f"else {general})")
+        return general
+
+    def compare(self, node: Element) -> str:
+        """A Python expression for the native bool of a comparison."""
+        op1, op2, operator = node.get('op1'), node.get('op2'), node.elem_type
+        if self.produces_int(op1) and self.produces_int(op2):
+            return f"({self.raw_int(op1)} {operator} {self.raw_int(op2)})"
+
+        general = f"_compare({operator!r}, {self.value(op1)}, {self.value(op2)})"
+        local1, local2 = self.local_int(op1), self.local_int(op2)
+        if local1 is not None and op2.elem_type == InterpreterBase.INT_NODE:
+            return f"({local1}.value {operator} {op2.get('val')!r} if _type({local1}) is _Int else {general})"
+        if local2 is not None and op1.elem_type == InterpreterBase.INT_NODE:
+            return f"({op1.get('val')!r} {operator} {local2}.value if _type({local2}) is _Int else {general})"
+        if local1 is not None and local2 is not None:
+            return (f"({local1}.value {operator} {local2}.value if _type({local1}) is _Int and _type({local2}) is _Int "
+                    f"else {general})")
+        return general
+
+    def condition(self, node: Element, statement) -> str:
+        if node.elem_type in COMPARISONS:
+            return self.compare(node)
+        return f"_truth({self.value(node)}, {statement!r})"
+
+    def arguments(self, node: Element) -> str:
+        return ", ".join(self.value(arg) for arg in node.get('args'))
+
+    def callee(self, node: Element) -> str:
+        if node.func is not None:
+            return self.constant(node.func)
+        return f"_callee({self.constant(node)})"
+
+    def call(self, node: Element) -> str:
+        identifier = node.get('name')
+        if identifier == 'print':
+            return f"_output(''.join([{', '.join(f'_str({self.value(arg)})' for arg in node.get('args'))}]))"
+        if identifier == 'inputi':
+            return f"_builtin('inputi', [{self.arguments(node)}])"
+        return f"_call({self.callee(node)}, [{self.arguments(node)}])"
+
+    def tail_call(self, node: Element) -> str:
+        discard = ", True" if node.discard else ""
+        return f"_tail({self.callee(node)}, [{self.arguments(node)}]{discard})"
+
+
+class PythonTranspiler:
+    """Runs Brewin functions as generated Python functions, with tree-walker semantics."""
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.env = interpreter.env
+        self.pending = None
+        self.reachable = None
+        self.namespace = self.helpers()
+
+    def run(self, func: FunctionObject):
+        # a tail call leaves (callee, args, discard) in self.pending and returns CONTROL.TAIL_CALL
+        result = self.compile(func)(self.env.current_frame.slots)
+        while result is CONTROL.TAIL_CALL:
+            func = self.pending[0]
+            self.interpreter.replace_frame(*self.pending)
+            result = self.compile(func)(self.env.current_frame.slots)
+        return result
+
+    def compile(self, func: FunctionObject):
+        if func.compiled is None:
+            transpiler = FunctionTranspiler(func, self.python_locals(func))
+            source = transpiler.source()
+            code = compile_source(source, func.name)
+
+            namespace = dict(self.namespace)
+            namespace.update((f"_k{i}", const) for i, const in enumerate(transpiler.constants))
+            exec(code, namespace)
+            func.compiled = namespace[transpiler.python_name()]
+        return func.compiled
+
+    def source(self, func: FunctionObject) -> str:
+        return FunctionTranspiler(func, self.python_locals(func)).source()
+
+    def python_locals(self, func: FunctionObject) -> set:
+        """The variables of func that can be Python locals: all of them under static
+        scoping; under dynamic scoping those that nothing func calls looks up by name."""
+        names = set(func.scope.names)
+        if self.env.scope_rule is ScopeRule.STATIC:
+            # a call resolved at runtime looks its name up in the frame
+            return names - {node.get('name') for statement in func.statements for node in walk(statement)
+                            if node.elem_type == InterpreterBase.FCALL_NODE and node.func is None}
+
+        if self.reachable is None:
+            self.summaries = {name: summarize_function(f) for name, f in self.interpreter.functions.items()}
+            self.reachable = reachable_free_names(self.summaries)
+        _, _, callees, dynamic_calls = self.summaries[func.name]
+        if dynamic_calls:
+            return set()
+        for callee in callees:
+            if self.reachable[callee] is None:
+                return set()
+            names -= self.reachable[callee]
+        return names
+
+    def helpers(self) -> dict:
+        """The names generated code uses besides its own constants."""
+        interpreter, env, error = self.interpreter, self.env, self.interpreter.error
+
+        def load(identifier):
+            value = env.retrieve(identifier=identifier)
+            if value is OBJECT_TYPES.UNINITIALIZED:
+                error(ErrorType.NAME_ERROR, f'Variable {identifier} was defined but not initialized')
+            elif value is ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                error(ErrorType.NAME_ERROR, f"Variable {identifier} has not been defined")
+            return value
+
+        def store(identifier, value):
+            if env.assign_identifier(identifier=identifier, value=value) == ENV_STATUS.IDENTIFIER_NOT_FOUND:
+                error(ErrorType.NAME_ERROR, f'Variable {identifier} has not been defined')
+
+        def uninit(identifier):
+            error(ErrorType.NAME_ERROR, f'Variable {identifier} was defined but not initialized')
+
+        def redefined(identifier):
+            error(ErrorType.NAME_ERROR, f'Redefinition of {identifier}')
+
+        def neg():
+            error(ErrorType.NAME_ERROR)
+
+        def arith(operator, val1, val2):
+            if type(val1) is not int:
+                if type(val1) is not Int:
+                    error(ErrorType.TYPE_ERROR, '+ operation can only be applied to ints')
+                val1 = val1.value
+            if type(val2) is not int:
+                if type(val2) is not Int:
+                    error(ErrorType.TYPE_ERROR, '+ operation can only be applied to ints')
+                val2 = val2.value
+            return val1 + val2 if operator == '+' else val1 - val2
+
+        def compare(operator, val1, val2):
+            return interpreter.compare(operator, val1, val2).value
+
+        def truth(value, statement):
+            if type(value) is not Bool:
+                error(ErrorType.TYPE_ERROR, f'Condition of {statement} must be a bool')
+            return value.value
+
+        def tail(func, args, discard=False):
+            self.pending = (func, args, discard)
+            return CONTROL.TAIL_CALL
+
+        # Python builtins too, since every Brewin function is bound under its own name
+        # in the namespace it runs in, and one may be called type
+        return {
+            '_type': type,
+            '_str': str,
+            '_Int': Int,
+            '_NOT_FOUND': ENV_STATUS.IDENTIFIER_NOT_FOUND,
+            '_UNINIT': OBJECT_TYPES.UNINITIALIZED,
+            '_TRUE': Environment.interned.true,
+            '_FALSE': Environment.interned.false,
+            '_box': Environment.interned.int,
+            '_output': interpreter.output,
+            '_builtin': interpreter.call_builtin,
+            '_call': interpreter.call_function,
+            '_callee': interpreter.callee,
+            '_tail': tail,
+            '_load': load,
+            '_store': store,
+            '_uninit': uninit,
+            '_redefined': redefined,
+            '_neg': neg,
+            '_arith': arith,
+            '_compare': compare,
+            '_truth': truth,
+        }
+
+
+def main():
+    from brewparse import parse_program
+    from interpreterv1 import Interpreter
+
+    with open(sys.argv[1], encoding="utf-8") as handle:
+        program_node = parse_program(handle.read())
+
+    scoping = "static" if "--scoping=static" in sys.argv[2:] else "dynamic"
+    interpreter = Interpreter(backend="python", scoping=scoping)
+    interpreter.load_program(program_node)
+    for func in interpreter.functions.values():
+        print(interpreter.compiler.source(func))
+
+
+if __name__ == "__main__":
+    main()